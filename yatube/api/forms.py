@@ -0,0 +1,11 @@
+from django import forms
+
+from posts.forms import PostForm
+from posts.models import Group
+
+
+class ApiPostForm(PostForm):
+    """Форма поста для API: группа передаётся слагом, а не id."""
+    group = forms.ModelChoiceField(
+        Group.objects.all(), required=False, to_field_name='slug'
+    )
@@ -0,0 +1,40 @@
+"""Представление моделей в JSON с выбором полей через ?fields=."""
+from operator import attrgetter
+
+from .errors import ApiError
+
+
+def _image_url(post):
+    return post.image.url if post.image else None
+
+
+POST_FIELDS = {
+    'id': attrgetter('pk'),
+    'text': attrgetter('text'),
+    'pub_date': attrgetter('pub_date'),
+    'author': attrgetter('author.username'),
+    'group': lambda post: post.group.slug if post.group_id else None,
+    'image': _image_url,
+}
+COMMENT_FIELDS = {
+    'id': attrgetter('pk'),
+    'text': attrgetter('text'),
+    'created': attrgetter('created'),
+    'author': attrgetter('author.username'),
+}
+
+
+def requested_fields(request, available):
+    """Поля из ?fields=a,b; без параметра — все поля."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(available)
+    fields = [field.strip() for field in raw.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise ApiError(f'Неизвестные поля: {", ".join(unknown)}.')
+    return fields
+
+
+def serialize(obj, fields, available):
+    return {field: available[field](obj) for field in fields}
@@ -0,0 +1,291 @@
+import json
+import time
+from unittest import mock
+
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+
+class ApiFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='api_author')
+        cls.reader = User.objects.create_user(username='api_reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='api-group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {number}', author=cls.author, group=cls.group
+            )
+            for number in range(13)
+        ]
+        cls.index_url = reverse('api:posts')
+
+    def setUp(self):
+        self.client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_feeds_return_json_pages(self):
+        """Ленты отдают JSON со страницей постов и курсором дальше."""
+        urls = [
+            self.index_url,
+            reverse('api:group_list', args=[self.group.slug]),
+            reverse('api:profile', args=[self.author.username]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                data = response.json()
+                self.assertEqual(len(data['results']), 10)
+                self.assertEqual(data['results'][0]['text'], 'Пост 12')
+                self.assertIsNotNone(data['next'])
+                self.assertIsNone(data['previous'])
+
+    def test_cursor_pagination(self):
+        """Курсор next ведёт на следующую страницу ленты."""
+        data = self.client.get(self.index_url).json()
+        second = self.client.get(
+            self.index_url, {'cursor': data['next']}
+        ).json()
+        self.assertEqual(
+            [post['text'] for post in second['results']],
+            ['Пост 2', 'Пост 1', 'Пост 0']
+        )
+        self.assertIsNone(second['next'])
+
+    def test_sparse_fieldsets(self):
+        """fields ограничивает поля, неизвестное поле — 400."""
+        data = self.client.get(self.index_url, {'fields': 'id,text'}).json()
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+        response = self.client.get(self.index_url, {'fields': 'password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_group_feed_describes_group(self):
+        """Лента группы описывает саму группу."""
+        data = self.client.get(
+            reverse('api:group_list', args=[self.group.slug])
+        ).json()
+        self.assertEqual(data['group']['title'], 'Группа')
+
+    def test_unchanged_feed_returns_304(self):
+        """Повторный запрос с ETag или датой даёт 304 без тела."""
+        response = self.client.get(self.index_url)
+        self.assertIn('Last-Modified', response)
+        etag = response['ETag']
+        not_modified = self.client.get(
+            self.index_url, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+        not_modified = self.client.get(
+            self.index_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_etag_changes_after_edit(self):
+        """Правка поста меняет ETag ленты."""
+        etag = self.client.get(self.index_url)['ETag']
+        post = Post.objects.get(pk=self.posts[0].pk)
+        post.text = 'Исправленный пост'
+        post.save()
+        response = self.client.get(self.index_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_last_modified_changes_after_edit(self):
+        """Правка сдвигает Last-Modified: If-Modified-Since не даёт 304."""
+        last_modified = self.client.get(self.index_url)['Last-Modified']
+        post = Post.objects.get(pk=self.posts[-1].pk)
+        post.text = 'Исправленный старый пост'
+        with mock.patch('posts.caching.time.time',
+                        return_value=time.time() + 60):
+            post.save()
+        response = self.client.get(
+            self.index_url, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['Last-Modified'], last_modified)
+
+    def test_follow_feed(self):
+        """Лента подписок только для своих, подписка через API."""
+        self.assertEqual(
+            self.client.get(reverse('api:follow_index')).status_code, 401
+        )
+        url = reverse('api:profile_follow', args=[self.author.username])
+        response = self.reader_client.post(url)
+        self.assertEqual(response.status_code, 201)
+        data = self.reader_client.get(reverse('api:follow_index')).json()
+        self.assertEqual(len(data['results']), 10)
+        response = self.reader_client.delete(url)
+        self.assertEqual(response.json(), {'following': False})
+        self.assertFalse(
+            Follow.objects.filter(user=self.reader, author=self.author)
+            .exists()
+        )
+
+
+class ApiWriteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='api_writer')
+        cls.other = User.objects.create_user(username='api_other')
+        cls.group = Group.objects.create(
+            title='Группа', slug='write-group', description='Описание'
+        )
+        cls.post = Post.objects.create(text='Черновик', author=cls.author)
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.other_client = Client()
+        self.other_client.force_login(self.other)
+
+    def send_json(self, client, method, url, data):
+        return getattr(client, method)(
+            url, json.dumps(data), content_type='application/json'
+        )
+
+    def test_guest_cannot_write(self):
+        """Гость не может создать пост: 401."""
+        response = Client().post(reverse('api:posts'), {'text': 'Гость'})
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(Post.objects.filter(text='Гость').exists())
+
+    def test_create_post(self):
+        """Автор создаёт пост с группой через JSON."""
+        response = self.send_json(
+            self.author_client, 'post', reverse('api:posts'),
+            {'text': 'Из API', 'group': self.group.slug}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['group'], self.group.slug)
+        self.assertTrue(Post.objects.filter(
+            text='Из API', author=self.author, group=self.group
+        ).exists())
+
+    def test_invalid_post_returns_errors(self):
+        """Ошибки формы возвращаются с кодом 400."""
+        response = self.send_json(
+            self.author_client, 'post', reverse('api:posts'), {'text': ''}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('text', response.json()['errors'])
+
+    def test_patch_post(self):
+        """Править пост может только автор, PATCH меняет часть полей."""
+        url = reverse('api:post_detail', args=[self.post.pk])
+        response = self.send_json(
+            self.other_client, 'patch', url, {'text': 'Чужая правка'}
+        )
+        self.assertEqual(response.status_code, 403)
+        response = self.send_json(
+            self.author_client, 'patch', url, {'group': self.group.slug}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.text, 'Черновик')
+        self.assertEqual(self.post.group, self.group)
+
+    def test_comments(self):
+        """Комментарии создаются и читаются через API."""
+        url = reverse('api:comments', args=[self.post.pk])
+        response = self.send_json(
+            self.other_client, 'post', url, {'text': 'Комментарий'}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Comment.objects.filter(post=self.post).count(), 1)
+        data = Client().get(url).json()
+        self.assertEqual(data['results'][0]['author'], 'api_other')
+
+    def test_missing_post_and_wrong_method(self):
+        """Нет поста — 404 в JSON, чужой метод — 405 с Allow."""
+        response = Client().get(reverse('api:post_detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'detail': 'Не найдено.'})
+        response = Client().put(reverse('api:posts'))
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response['Allow'], 'GET, POST')
+
+
+class ApiFollowBulkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='newcomer')
+        cls.authors = [
+            User.objects.create_user(username=f'author{number}')
+            for number in range(12)
+        ]
+        for author in cls.authors:
+            Post.objects.create(author=author, text=f'Пост {author}')
+        cls.url = reverse('api:follow_bulk')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def send(self, method, usernames):
+        return getattr(self.client, method)(
+            self.url, json.dumps({'usernames': usernames}),
+            content_type='application/json',
+        )
+
+    def test_follow_many_authors(self):
+        """Подписка на список авторов одним запросом."""
+        Follow.objects.create(user=self.user, author=self.authors[0])
+        usernames = [author.username for author in self.authors[:3]]
+        response = self.send('post', usernames + ['ghost', 'newcomer'])
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['following'], {
+            'author0': True, 'author1': True, 'author2': True,
+            'newcomer': False,
+        })
+        self.assertEqual(data['changed'], ['author1', 'author2'])
+        self.assertEqual(data['not_found'], ['ghost'])
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).following_count, 3
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.authors[1]).followers_count, 1
+        )
+        feed = self.client.get(reverse('api:follow_index')).json()
+        self.assertEqual(len(feed['results']), 3)
+
+    def test_query_count_does_not_grow_with_authors(self):
+        """Число запросов не зависит от числа авторов."""
+        for count in (2, 10):
+            usernames = [author.username for author in self.authors[:count]]
+            # Метку основной базы в сессии ставит уже эта запись.
+            self.send('delete', usernames)
+            with self.subTest(authors=count), self.assertNumQueries(12):
+                self.send('post', usernames)
+            with self.subTest(authors=count), self.assertNumQueries(12):
+                self.send('delete', usernames)
+
+    def test_unfollow_many_authors(self):
+        """Отписка от списка авторов одним запросом."""
+        usernames = [author.username for author in self.authors[:4]]
+        self.send('post', usernames)
+        data = self.send('delete', usernames[:2]).json()
+        self.assertEqual(data['changed'], ['author0', 'author1'])
+        self.assertEqual(
+            set(Follow.objects.filter(user=self.user)
+                .values_list('author__username', flat=True)),
+            {'author2', 'author3'}
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).following_count, 2
+        )
+        feed = self.client.get(reverse('api:follow_index')).json()
+        self.assertEqual(len(feed['results']), 2)
+
+    def test_invalid_requests(self):
+        """Не список и слишком длинный список — 400."""
+        self.assertEqual(self.send('post', 'author0').status_code, 400)
+        self.assertEqual(
+            self.send('post', ['x'] * 101).status_code, 400
+        )
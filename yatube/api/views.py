@@ -0,0 +1,245 @@
+"""JSON API лент и постов для мобильных клиентов.
+
+Ленты листаются курсором (?cursor=), как и HTML-версии, а набор полей
+задаётся через ?fields=. Ответ ленты несёт ETag и Last-Modified: оба
+выводятся из версий ленты в posts.caching (дата — ещё и из самого
+свежего поста), поэтому правка и удаление меняют и их. Клиент с
+актуальной копией получает 304 без выборки страницы.
+"""
+import json
+from functools import wraps
+
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from posts.caching import feed_validators
+from posts.follows import follow_many, unfollow_many
+from posts.forms import CommentForm
+from posts.models import Follow, Group, Post, User
+from posts.thumbnails import enqueue_thumbnails
+from posts.timelines import timeline_posts
+from posts.utils import CursorPaginator
+from yatube.settings import (COMMENTS_PER_PAGE, FOLLOW_BULK_LIMIT,
+                             PAGINATOR_AMOUNT)
+from .errors import ApiError
+from .forms import ApiPostForm
+from .serializers import (COMMENT_FIELDS, POST_FIELDS, requested_fields,
+                          serialize)
+
+
+def json_response(data, status=200):
+    return JsonResponse(
+        data, status=status, json_dumps_params={'ensure_ascii': False}
+    )
+
+
+def api_view(*methods):
+    """Проверяет метод и авторизацию записи, ошибки отдаёт в JSON."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                response = json_response(
+                    {'detail': 'Метод не поддерживается.'}, status=405
+                )
+                response['Allow'] = ', '.join(methods)
+                return response
+            try:
+                if (request.method != 'GET'
+                        and not request.user.is_authenticated):
+                    raise ApiError('Требуется авторизация.', status=401)
+                return view(request, *args, **kwargs)
+            except Http404:
+                return json_response({'detail': 'Не найдено.'}, status=404)
+            except ApiError as error:
+                return json_response(
+                    {'detail': error.detail}, status=error.status
+                )
+        return wrapper
+    return decorator
+
+
+def request_data(request):
+    if request.content_type != 'application/json':
+        return request.POST
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ApiError('Некорректный JSON.')
+    if not isinstance(data, dict):
+        raise ApiError('Ожидается JSON-объект.')
+    return data
+
+
+def form_errors(form):
+    return json_response({'errors': form.errors}, status=400)
+
+
+def page_data(paginator, request, fields, available):
+    page = paginator.page(request.GET.get('cursor'))
+    return {
+        'results': [serialize(obj, fields, available) for obj in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }
+
+
+def feed_response(request, posts, scopes, field='pub_date', extra=None):
+    """Страница ленты с ETag/Last-Modified или 304 для свежей копии."""
+    fields = requested_fields(request, POST_FIELDS)
+    etag, last_modified = feed_validators(
+        posts, scopes, field, salt=request.get_full_path()
+    )
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        paginator = CursorPaginator(posts, PAGINATOR_AMOUNT, field)
+        response = json_response({
+            **(extra or {}),
+            **page_data(paginator, request, fields, POST_FIELDS),
+        })
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+@api_view('GET', 'POST')
+def posts(request):
+    if request.method == 'GET':
+        return feed_response(request, Post.objects.for_feed(), ('index',))
+    form = ApiPostForm(request_data(request), files=request.FILES or None)
+    if not form.is_valid():
+        return form_errors(form)
+    post = form.save(commit=False)
+    post.author = request.user
+    post.save()
+    enqueue_thumbnails(post)
+    return json_response(serialize(post, POST_FIELDS, POST_FIELDS),
+                         status=201)
+
+
+@api_view('GET', 'PATCH')
+def post_detail(request, post_id):
+    post = get_object_or_404(Post.objects.for_feed(), pk=post_id)
+    if request.method == 'PATCH':
+        if post.author != request.user:
+            raise ApiError('Редактировать можно только свои посты.',
+                           status=403)
+        data = {
+            'text': post.text,
+            'group': post.group.slug if post.group_id else None,
+            **request_data(request),
+        }
+        form = ApiPostForm(data, instance=post)
+        if not form.is_valid():
+            return form_errors(form)
+        post = form.save()
+    fields = requested_fields(request, POST_FIELDS)
+    return json_response(serialize(post, fields, POST_FIELDS))
+
+
+@api_view('GET', 'POST')
+def comments(request, post_id):
+    post = get_object_or_404(Post, pk=post_id)
+    if request.method == 'POST':
+        form = CommentForm(request_data(request))
+        if not form.is_valid():
+            return form_errors(form)
+        comment = form.save(commit=False)
+        comment.author = request.user
+        comment.post = post
+        comment.save()
+        return json_response(
+            serialize(comment, COMMENT_FIELDS, COMMENT_FIELDS), status=201
+        )
+    fields = requested_fields(request, COMMENT_FIELDS)
+    paginator = CursorPaginator(
+        post.comments.select_related('author'),
+        COMMENTS_PER_PAGE,
+        field='created'
+    )
+    return json_response(
+        page_data(paginator, request, fields, COMMENT_FIELDS)
+    )
+
+
+@api_view('GET')
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return feed_response(
+        request, group.posts.for_feed(), (f'group:{group.pk}',),
+        extra={'group': {
+            'slug': group.slug,
+            'title': group.title,
+            'description': group.description,
+        }}
+    )
+
+
+@api_view('GET')
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return feed_response(
+        request, author.posts.for_feed(), (f'profile:{author.pk}',)
+    )
+
+
+@api_view('GET')
+def follow_index(request):
+    if not request.user.is_authenticated:
+        raise ApiError('Требуется авторизация.', status=401)
+    return feed_response(
+        request,
+        timeline_posts(request.user).for_feed(),
+        (f'follow:{request.user.pk}', 'index'),
+        field='timeline_date',
+    )
+
+
+@api_view('POST', 'DELETE')
+def profile_follow(request, username):
+    author = get_object_or_404(User, username=username)
+    if author == request.user:
+        raise ApiError('Нельзя подписаться на себя.')
+    if request.method == 'DELETE':
+        get_object_or_404(Follow, user=request.user, author=author).delete()
+        return json_response({'following': False})
+    _, created = Follow.objects.get_or_create(
+        user=request.user, author=author
+    )
+    return json_response({'following': True}, status=201 if created else 200)
+
+
+@api_view('POST', 'DELETE')
+def follow_bulk(request):
+    """Подписка (POST) или отписка (DELETE) по списку usernames."""
+    usernames = request_data(request).get('usernames')
+    if (not isinstance(usernames, list)
+            or not all(isinstance(name, str) for name in usernames)):
+        raise ApiError('Ожидается список usernames.')
+    if len(usernames) > FOLLOW_BULK_LIMIT:
+        raise ApiError(
+            f'Не больше {FOLLOW_BULK_LIMIT} пользователей за запрос.'
+        )
+    authors = dict(User.objects.filter(
+        username__in=usernames
+    ).values_list('username', 'pk'))
+    if request.method == 'POST':
+        changed = follow_many(request.user, authors.values())
+        following = set(authors.values()) - {request.user.pk}
+    else:
+        changed = unfollow_many(request.user, authors.values())
+        following = set()
+    return json_response({
+        'following': {
+            username: pk in following for username, pk in authors.items()
+        },
+        'changed': sorted(
+            username for username, pk in authors.items() if pk in changed
+        ),
+        'not_found': sorted(set(usernames) - set(authors)),
+    })
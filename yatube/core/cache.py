@@ -0,0 +1,71 @@
+"""Бэкенды кеша со счётчиками попаданий и общим memcached.
+
+В бою кеш — memcached (pylibmc), общий для всех воркеров gunicorn,
+поэтому сброс версий лент виден всем процессам. Локально и в тестах
+его заменяет LocMemCache с тем же интерфейсом и метриками.
+"""
+import threading
+from collections import Counter
+
+from django.core.cache.backends import locmem, memcached
+from django.utils.functional import cached_property
+
+_MISSING = object()
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def cache_stats():
+    """Попадания и промахи по префиксам: {(prefix, 'hits'): n, ...}."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _count(prefix, hits, misses):
+    with _stats_lock:
+        _stats[prefix, 'hits'] += hits
+        _stats[prefix, 'misses'] += misses
+
+
+class CacheStatsMixin:
+    """Считает попадания и промахи по KEY_PREFIX кеша.
+
+    Базовый get_many вызывает get для каждого ключа, поэтому свой
+    get_many со счётчиками нужен только бэкендам с пакетным чтением.
+    """
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        if value is _MISSING:
+            _count(self.key_prefix, 0, 1)
+            return default
+        _count(self.key_prefix, 1, 0)
+        return value
+
+
+class LocMemCache(CacheStatsMixin, locmem.LocMemCache):
+    """Локальная замена общего кеша для разработки и тестов."""
+
+
+class MemcachedCache(CacheStatsMixin, memcached.PyLibMCCache):
+    """Общий кеш на memcached с переиспользованием соединений.
+
+    Django создаёт отдельный объект кеша на каждый алиас и поток;
+    клиент libmemcached здесь один на поток и набор серверов, так что
+    алиасы с разными KEY_PREFIX ходят через одни и те же соединения.
+    """
+    _clients = threading.local()
+
+    @cached_property
+    def _cache(self):
+        clients = self._clients.__dict__
+        key = (tuple(self._servers), repr(sorted(self._options.items())))
+        if key not in clients:
+            clients[key] = self._lib.Client(self._servers, **self._options)
+        return clients[key]
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = super().get_many(keys, version)
+        _count(self.key_prefix, len(values), len(keys) - len(values))
+        return values
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.checks import Info, Warning, register
+
+
+def _describe(alias):
+    # Только настройки: проверка не открывает соединений с базой.
+    config = settings.DATABASES[alias]
+    engine = config['ENGINE'].rsplit('.', 1)[-1]
+    where = config['NAME']
+    if config.get('HOST'):
+        where = f'{where}@{config["HOST"]}:{config.get("PORT") or "-"}'
+    text = f'{alias}: {engine} {where}, CONN_MAX_AGE={config["CONN_MAX_AGE"]}'
+    if engine == 'sqlite3':
+        text += ''.join(
+            f', {pragma}={value}'
+            for pragma, value in settings.SQLITE_PRAGMAS.items()
+        )
+    return text
+
+
+@register()
+def database_settings(app_configs, **kwargs):
+    """Действующие настройки баз при каждом запуске."""
+    return [
+        Info(_describe(alias), id='core.I001')
+        for alias in settings.DATABASES
+    ]
+
+
+@register(deploy=True)
+def database_deploy(app_configs, **kwargs):
+    """Советы для продакшена: manage.py check --deploy."""
+    messages = []
+    for alias, config in settings.DATABASES.items():
+        if config['ENGINE'].endswith('sqlite3'):
+            messages.append(Warning(
+                f'{alias}: SQLite пропускает одного писателя за раз.',
+                hint='Задайте DATABASE_URL=postgres://...',
+                id='core.W002',
+            ))
+        elif not config['CONN_MAX_AGE']:
+            messages.append(Warning(
+                f'{alias}: соединение открывается на каждый запрос.',
+                hint='Задайте DATABASE_CONN_MAX_AGE.',
+                id='core.W003',
+            ))
+    return messages
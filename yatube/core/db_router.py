@@ -0,0 +1,89 @@
+"""Чтение с реплик базы, запись и свежие данные — с основной.
+
+Роутер отправляет чтения на случайную реплику из DATABASE_REPLICAS,
+а записи — на основную базу. Реплика может отставать, поэтому запрос
+с записью (не GET/HEAD/OPTIONS или view под pin_to_primary) целиком
+читает с основной и «приклеивает» к ней пользователя на
+PRIMARY_STICKY_SECONDS: метка лежит в сессии, и сразу после публикации,
+комментария или подписки человек видит свои изменения. Сессии всегда
+читаются с основной базы — по ним и решается, куда идти.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+
+PRIMARY = 'default'
+PRIMARY_ONLY_APPS = {'sessions'}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STICKY_KEY = '_primary_until'
+
+_local = threading.local()
+
+
+def pinned():
+    return getattr(_local, 'pinned', False)
+
+
+@contextmanager
+def use_primary():
+    """Внутри блока все чтения идут на основную базу."""
+    previous = pinned()
+    _local.pinned = True
+    try:
+        yield
+    finally:
+        _local.pinned = previous
+
+
+def stick_to_primary(request):
+    session = getattr(request, 'session', None)
+    if session is None:
+        return
+    now = time.time()
+    window = settings.PRIMARY_STICKY_SECONDS
+    # Серия записей не сохраняет сессию каждый раз: метка продлевается,
+    # когда от окна осталось меньше половины.
+    if session.get(STICKY_KEY, 0) - now < window / 2:
+        session[STICKY_KEY] = now + window
+
+
+def is_sticky(request):
+    session = getattr(request, 'session', None)
+    return session is not None and session.get(STICKY_KEY, 0) > time.time()
+
+
+def pin_to_primary(view):
+    """Для view, которые пишут в базу, в том числе по GET."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with use_primary():
+            response = view(request, *args, **kwargs)
+        stick_to_primary(request)
+        return response
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if (not replicas or pinned()
+                or model._meta.app_label in PRIMARY_ONLY_APPS):
+            return PRIMARY
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Реплики получают схему репликацией с основной базы.
+        return db not in settings.DATABASE_REPLICAS
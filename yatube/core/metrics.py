@@ -0,0 +1,216 @@
+"""Гистограммы времени ответа и SQL по view для /metrics.
+
+Каждый воркер копит гистограммы у себя в памяти: на запрос это
+несколько perf_counter и bisect под локом. Раз в METRICS_FLUSH_INTERVAL
+секунд воркер кладёт свой снимок в общий кеш под собственным ключом,
+поэтому воркеры не перетирают данные друг друга. Список воркеров тоже
+лежит в кеше; если гонка или вытеснение потеряли запись, воркер
+добавит себя снова при следующей публикации. /metrics складывает
+снимки всех воркеров.
+"""
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .cache import cache_stats
+
+CACHE_ALIAS = 'default'
+WORKERS_KEY = 'metrics:workers'
+WORKER_KEY = 'metrics:worker:{}'
+# Снимок умершего воркера со временем исчезает; Prometheus увидит это
+# как сброс счётчиков и учтёт его.
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+SECONDS_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+HISTOGRAMS = {
+    'request_duration_seconds': (
+        SECONDS_BUCKETS, 'Полное время обработки запроса.'
+    ),
+    'sql_queries': (QUERY_BUCKETS, 'Число SQL-запросов за запрос.'),
+    'sql_duration_seconds': (
+        SECONDS_BUCKETS, 'Суммарное время SQL-запросов за запрос.'
+    ),
+    'template_duration_seconds': (
+        SECONDS_BUCKETS, 'Время рендеринга шаблонов за запрос.'
+    ),
+    'image_step_duration_seconds': (
+        SECONDS_BUCKETS, 'Время шагов обработки загруженной картинки.'
+    ),
+}
+# Имя метки, если гистограмма разбита не по view.
+LABELS = {'image_step_duration_seconds': 'step'}
+PREFIX = 'yatube_'
+
+_lock = threading.Lock()
+_histograms = {}
+_local = threading.local()
+_worker = {'pid': None, 'id': None, 'flushed': 0.0}
+
+
+class RequestTimings:
+    """Счётчики одного запроса; SQL меряется через execute_wrapper."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.queries += 1
+
+
+def start_request():
+    _local.timings = RequestTimings()
+    return _local.timings
+
+
+def current_timings():
+    return getattr(_local, 'timings', None)
+
+
+def finish_request(view, duration):
+    timings = _local.__dict__.pop('timings', None)
+    if timings is not None:
+        observe(view, {
+            'request_duration_seconds': duration,
+            'sql_queries': timings.queries,
+            'sql_duration_seconds': timings.sql_time,
+            'template_duration_seconds': timings.template_time,
+        })
+    flush()
+
+
+def observe(view, values):
+    with _lock:
+        for metric, value in values.items():
+            buckets = HISTOGRAMS[metric][0]
+            histogram = _histograms.get((metric, view))
+            if histogram is None:
+                histogram = _histograms[metric, view] = {
+                    'buckets': [0] * (len(buckets) + 1),
+                    'sum': 0,
+                    'count': 0,
+                }
+            histogram['buckets'][bisect_left(buckets, value)] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+
+def snapshot():
+    """Копия гистограмм и счётчиков кеша этого процесса."""
+    with _lock:
+        histograms = {
+            key: {**value, 'buckets': list(value['buckets'])}
+            for key, value in _histograms.items()
+        }
+    return {'histograms': histograms, 'cache': cache_stats()}
+
+
+def _worker_id():
+    # После fork id родителя не наследуется: у процесса он свой.
+    if _worker['pid'] != os.getpid():
+        _worker.update(pid=os.getpid(), id=uuid.uuid4().hex)
+    return _worker['id']
+
+
+def _register(cache, worker_id):
+    workers = cache.get(WORKERS_KEY) or set()
+    if worker_id in workers:
+        return
+    # Заодно забываем воркеров, чьи снимки уже истекли.
+    alive = cache.get_many([WORKER_KEY.format(w) for w in workers])
+    cache.set(WORKERS_KEY, {
+        w for w in workers if WORKER_KEY.format(w) in alive
+    } | {worker_id}, None)
+
+
+def flush(force=False):
+    """Публикует снимок процесса в общем кеше не чаще интервала."""
+    now = time.monotonic()
+    if not force and now - _worker['flushed'] < (
+            settings.METRICS_FLUSH_INTERVAL):
+        return
+    _worker['flushed'] = now
+    cache = caches[CACHE_ALIAS]
+    worker_id = _worker_id()
+    cache.set(WORKER_KEY.format(worker_id), snapshot(), SNAPSHOT_TIMEOUT)
+    _register(cache, worker_id)
+
+
+def collect():
+    """Сумма снимков всех воркеров; свой берётся без кеша."""
+    cache = caches[CACHE_ALIAS]
+    own = _worker_id()
+    keys = [
+        WORKER_KEY.format(worker_id)
+        for worker_id in cache.get(WORKERS_KEY) or ()
+        if worker_id != own
+    ]
+    histograms, cache_counts = {}, {}
+    for worker in [snapshot(), *cache.get_many(keys).values()]:
+        for key, value in worker['histograms'].items():
+            total = histograms.setdefault(key, {
+                'buckets': [0] * len(value['buckets']),
+                'sum': 0,
+                'count': 0,
+            })
+            for index, count in enumerate(value['buckets']):
+                total['buckets'][index] += count
+            total['sum'] += value['sum']
+            total['count'] += value['count']
+        for key, count in worker['cache'].items():
+            cache_counts[key] = cache_counts.get(key, 0) + count
+    return histograms, cache_counts
+
+
+def _label(value):
+    return (
+        str(value).replace('\\', r'\\').replace('"', r'\"')
+        .replace('\n', r'\n')
+    )
+
+
+def render_prometheus():
+    """Метрики в текстовом формате Prometheus."""
+    histograms, cache_counts = collect()
+    lines = []
+    for metric, (buckets, help_text) in HISTOGRAMS.items():
+        name = PREFIX + metric
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        views = sorted(view for key, view in histograms if key == metric)
+        for view in views:
+            histogram = histograms[metric, view]
+            label = f'{LABELS.get(metric, "view")}="{_label(view)}"'
+            cumulative = 0
+            for bound, count in zip(
+                    (*buckets, '+Inf'), histogram['buckets']):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{{{label},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'{name}_sum{{{label}}} {histogram["sum"]}')
+            lines.append(f'{name}_count{{{label}}} {histogram["count"]}')
+    name = PREFIX + 'cache_requests_total'
+    lines += [
+        f'# HELP {name} Обращения к кешу по префиксу ключей.',
+        f'# TYPE {name} counter',
+    ]
+    for (prefix, result), count in sorted(cache_counts.items()):
+        lines.append(
+            f'{name}{{prefix="{_label(prefix)}",result="{result}"}} {count}'
+        )
+    return '\n'.join(lines) + '\n'
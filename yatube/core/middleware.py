@@ -0,0 +1,54 @@
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+from . import metrics
+from .db_router import (SAFE_METHODS, is_sticky, stick_to_primary,
+                        use_primary)
+
+
+class MetricsMiddleware:
+    """Пишет в гистограммы время ответа, SQL и шаблоны по имени view.
+
+    Стоит первым в MIDDLEWARE, чтобы время включало остальные слои.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        timings = metrics.start_request()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            match = getattr(request, 'resolver_match', None)
+            metrics.finish_request(
+                match.view_name if match else 'unresolved',
+                time.perf_counter() - started,
+            )
+        return response
+
+
+class PrimaryStickinessMiddleware:
+    """Запросы с записью и «приклеенные» сессии читают с основной базы.
+
+    Стоит после SessionMiddleware: метка хранится в сессии.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writes = request.method not in SAFE_METHODS
+        if not writes and not is_sticky(request):
+            return self.get_response(request)
+        with use_primary():
+            response = self.get_response(request)
+        if writes:
+            stick_to_primary(request)
+        return response
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """WAL, synchronous=NORMAL и ожидание блокировки для SQLite.
+
+    WAL пускает читателей параллельно с писателем, а busy_timeout
+    заставляет второго писателя подождать вместо «database is locked».
+    """
+    if connection.vendor != 'sqlite':
+        return
+    for pragma, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute(f'PRAGMA {pragma} = {value}')
@@ -0,0 +1,38 @@
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends import django
+
+from . import metrics
+
+
+class TimedTemplate(django.Template):
+    """Шаблон, время рендеринга которого попадает в метрики запроса.
+
+    Меряется только внешний render: вложенные шаблоны уже входят в него.
+    """
+
+    def render(self, context=None, request=None):
+        timings = metrics.current_timings()
+        if timings is None or timings.rendering:
+            return super().render(context, request)
+        timings.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.rendering = False
+            timings.template_time += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(django.DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(
+                self.engine.get_template(template_name), self
+            )
+        except TemplateDoesNotExist as exc:
+            django.reraise(exc, self)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Comment, Group, Follow, Post
+from .models import Comment, Group, Follow, Post, ThumbnailTask
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -15,3 +15,4 @@ admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
 admin.site.register(Comment)
 admin.site.register(Follow)
+admin.site.register(ThumbnailTask)
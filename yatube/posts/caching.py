@@ -0,0 +1,113 @@
+"""Версионные ключи для кеша фрагментов лент.
+
+У каждой ленты свой счётчик версии: 'index', 'group:<id>',
+'profile:<id>', 'follow:<id>' и общий 'groups' для названий групп.
+Сигналы увеличивают версии при изменениях, поэтому страницы можно
+держать в кеше минутами: устаревший ключ просто больше не читается.
+"""
+import math
+import time
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import DEFERRED
+from django.utils.http import quote_etag
+
+CACHE_ALIAS = 'posts'
+VERSION_KEY = 'feed_version:{}'
+# Когда версия ленты менялась последний раз, unix-время.
+CHANGED_KEY = 'feed_changed:{}'
+
+
+def _initial_version():
+    # Версия после вытеснения из кеша не совпадёт ни с одной прежней.
+    return time.time_ns()
+
+
+def _scope_values(template, scopes, initial):
+    cache = caches[CACHE_ALIAS]
+    keys = [template.format(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, initial(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def feed_versions(scopes):
+    return _scope_values(VERSION_KEY, scopes, _initial_version)
+
+
+def feed_changed_at(scopes):
+    """Время последнего изменения каждой ленты, unix-время."""
+    return _scope_values(CHANGED_KEY, scopes, time.time)
+
+
+def bump_feed_versions(*scopes):
+    cache = caches[CACHE_ALIAS]
+    for scope in scopes:
+        key = VERSION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+    now = time.time()
+    cache.set_many({CHANGED_KEY.format(scope): now for scope in scopes}, None)
+
+
+def bump_all_feeds():
+    """Сбрасывает все ленты: версия 'groups' входит в каждый ключ."""
+    bump_feed_versions('groups')
+
+
+def bump_post_feeds(post):
+    """Сбрасывает ленты, где виден пост, включая его прежнюю группу.
+
+    Заодно сбрасываются страница поста и страницы со счётчиками автора.
+    """
+    # Ленты подписок завязаны на версию 'index' и сбрасываются вместе с ней.
+    scopes = {
+        'index', f'profile:{post.author_id}',
+        f'post:{post.pk}', f'author:{post.author_id}',
+    }
+    initial_group_id = getattr(post, '_initial_group_id', None)
+    for group_id in (initial_group_id, post.group_id):
+        if group_id not in (None, DEFERRED):
+            scopes.add(f'group:{group_id}')
+    bump_feed_versions(*scopes)
+    post._initial_group_id = post.group_id
+
+
+def feed_cache(request, *scopes):
+    """Контекст для {% cache feed_cache_timeout ... feed_cache_key %}."""
+    scopes += ('groups',)
+    versions = feed_versions(scopes)
+    page = request.GET.get('cursor') or request.GET.get('page') or ''
+    key = ','.join(f'{s}={v}' for s, v in zip(scopes, versions))
+    return {
+        'feed_cache_key': f'{key}|{page}',
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
+
+
+def feed_validators(posts, scopes, field='pub_date', salt=''):
+    """ETag и Last-Modified (unix-время) ленты для условного GET.
+
+    ETag строится по версиям лент, дата — по времени их последнего
+    изменения и самому свежему посту, так что правка и удаление меняют
+    и то и другое. salt различает представления.
+    """
+    newest = posts.order_by(f'-{field}').values_list(
+        field, flat=True
+    ).first()
+    scopes += ('groups',)
+    versions = feed_versions(scopes)
+    etag = quote_etag(
+        md5(f'{versions}|{newest}|{salt}'.encode()).hexdigest()
+    )
+    # Вверх до секунды: правка в ту же секунду, что и прошлый ответ,
+    # всё равно даёт более позднюю дату.
+    changed = math.ceil(max(feed_changed_at(scopes)))
+    return etag, max(changed, int(newest.timestamp()) if newest else 0)
@@ -0,0 +1,191 @@
+"""Ленты Atom, RSS и JSON Feed для главной, групп и авторов.
+
+Опрос ленты без изменений стоит одного запроса за датой свежего поста:
+ETag и Last-Modified те же, что у JSON API, и клиент получает 304.
+Иначе посты читаются через values() без моделей и шаблонов, ответ
+отдаётся потоком и заодно складывается в кеш под своим ETag, так что
+следующие опросчики без заголовков получают готовое тело.
+"""
+import json
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.feedgenerator import rfc2822_date, rfc3339_date
+from django.utils.http import http_date
+from django.utils.text import Truncator
+
+from .caching import CACHE_ALIAS, feed_validators
+from .models import Group, Post, User
+
+BODY_KEY = 'syndication:{}'
+CONTENT_TYPES = {
+    'atom': 'application/atom+xml; charset=utf-8',
+    'rss': 'application/rss+xml; charset=utf-8',
+    'json': 'application/feed+json; charset=utf-8',
+}
+ITEM_FIELDS = (
+    'pk', 'text', 'pub_date',
+    'author__username', 'author__first_name', 'author__last_name',
+)
+
+
+def _items(request, posts):
+    rows = posts.order_by('-pub_date', '-pk').values(*ITEM_FIELDS)
+    for row in rows[:settings.SYNDICATION_ITEMS].iterator():
+        full_name = f'{row["author__first_name"]} {row["author__last_name"]}'
+        yield {
+            'url': request.build_absolute_uri(
+                reverse('posts:post_detail', args=[row['pk']])
+            ),
+            'title': Truncator(row['text']).words(8),
+            'text': row['text'],
+            'date': row['pub_date'],
+            'author': full_name.strip() or row['author__username'],
+        }
+
+
+def atom(meta, items):
+    yield (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<feed xmlns="http://www.w3.org/2005/Atom">'
+        f'<title>{escape(meta["title"])}</title>'
+        f'<link href={quoteattr(meta["link"])} rel="alternate"/>'
+        f'<link href={quoteattr(meta["self"])} rel="self"/>'
+        f'<id>{escape(meta["link"])}</id>'
+        f'<updated>{rfc3339_date(meta["updated"])}</updated>'
+    )
+    for item in items:
+        yield (
+            '<entry>'
+            f'<title>{escape(item["title"])}</title>'
+            f'<link href={quoteattr(item["url"])} rel="alternate"/>'
+            f'<id>{escape(item["url"])}</id>'
+            f'<published>{rfc3339_date(item["date"])}</published>'
+            f'<updated>{rfc3339_date(item["date"])}</updated>'
+            f'<author><name>{escape(item["author"])}</name></author>'
+            f'<content type="text">{escape(item["text"])}</content>'
+            '</entry>'
+        )
+    yield '</feed>\n'
+
+
+def rss(meta, items):
+    yield (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/"><channel>'
+        f'<title>{escape(meta["title"])}</title>'
+        f'<link>{escape(meta["link"])}</link>'
+        f'<description>{escape(meta["title"])}</description>'
+        f'<atom:link href={quoteattr(meta["self"])} rel="self"/>'
+        f'<lastBuildDate>{rfc2822_date(meta["updated"])}</lastBuildDate>'
+    )
+    for item in items:
+        yield (
+            '<item>'
+            f'<title>{escape(item["title"])}</title>'
+            f'<link>{escape(item["url"])}</link>'
+            f'<guid isPermaLink="true">{escape(item["url"])}</guid>'
+            f'<pubDate>{rfc2822_date(item["date"])}</pubDate>'
+            f'<dc:creator>{escape(item["author"])}</dc:creator>'
+            f'<description>{escape(item["text"])}</description>'
+            '</item>'
+        )
+    yield '</channel></rss>\n'
+
+
+def json_feed(meta, items):
+    head = json.dumps({
+        'version': 'https://jsonfeed.org/version/1.1',
+        'title': meta['title'],
+        'home_page_url': meta['link'],
+        'feed_url': meta['self'],
+    }, ensure_ascii=False)
+    yield head[:-1] + ', "items": ['
+    separator = ''
+    for item in items:
+        yield separator + json.dumps({
+            'id': item['url'],
+            'url': item['url'],
+            'title': item['title'],
+            'content_text': item['text'],
+            'date_published': rfc3339_date(item['date']),
+            'authors': [{'name': item['author']}],
+        }, ensure_ascii=False)
+        separator = ', '
+    yield ']}\n'
+
+
+WRITERS = {'atom': atom, 'rss': rss, 'json': json_feed}
+
+
+def _cache_body(chunks, key):
+    body = []
+    for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+    caches[CACHE_ALIAS].set(key, ''.join(body), settings.FEED_CACHE_TIMEOUT)
+
+
+def syndication_response(request, fmt, posts, scopes, title, link):
+    # В тексте абсолютные ссылки, поэтому схема и хост входят в ETag,
+    # а с ним и в ключ кеша.
+    etag, last_modified = feed_validators(
+        posts, scopes, salt=f'{fmt}|{request.build_absolute_uri("/")}'
+    )
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        key = BODY_KEY.format(etag.strip('"'))
+        body = caches[CACHE_ALIAS].get(key)
+        if body is not None:
+            response = HttpResponse(body, content_type=CONTENT_TYPES[fmt])
+        else:
+            meta = {
+                'title': title,
+                'link': request.build_absolute_uri(link),
+                'self': request.build_absolute_uri(),
+                'updated': datetime.fromtimestamp(
+                    last_modified or 0, tz=timezone.utc
+                ),
+            }
+            chunks = WRITERS[fmt](meta, _items(request, posts))
+            response = StreamingHttpResponse(
+                _cache_body(chunks, key), content_type=CONTENT_TYPES[fmt]
+            )
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def index_feed(request, fmt):
+    return syndication_response(
+        request, fmt, Post.objects.all(), ('index',),
+        'Последние обновления на сайте', reverse('posts:index'),
+    )
+
+
+def group_feed(request, slug, fmt):
+    group = get_object_or_404(Group, slug=slug)
+    return syndication_response(
+        request, fmt, group.posts.all(), (f'group:{group.pk}',),
+        f'Записи сообщества {group.title}',
+        reverse('posts:group_list', args=[slug]),
+    )
+
+
+def profile_feed(request, username, fmt):
+    author = get_object_or_404(User, username=username)
+    return syndication_response(
+        request, fmt, author.posts.all(), (f'profile:{author.pk}',),
+        f'Записи {author.get_full_name() or author.username}',
+        reverse('posts:profile', args=[username]),
+    )
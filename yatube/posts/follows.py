@@ -0,0 +1,77 @@
+"""Подписка и отписка сразу от многих авторов.
+
+Одиночные подписки обслуживают сигналы Follow. Здесь строки пишутся
+одним bulk_create и удаляются одним delete() с выключенным приёмником
+post_delete, поэтому счётчики, ленты, версии лент и страниц
+обновляются тут же, тоже пачкой.
+Параллельная одиночная подписка может сбить счётчик на единицу;
+такие расхождения чинит reconcile_stats.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from . import timelines
+from .caching import bump_feed_versions
+from .models import Follow
+from .page_cache import purge_pages
+from .stats import change_counter, change_counters
+
+_local = threading.local()
+
+
+def in_bulk_unfollow():
+    return getattr(_local, 'bulk_unfollow', False)
+
+
+@contextmanager
+def bulk_unfollow():
+    """Внутри блока приёмник post_delete у Follow ничего не делает."""
+    previous = in_bulk_unfollow()
+    _local.bulk_unfollow = True
+    try:
+        yield
+    finally:
+        _local.bulk_unfollow = previous
+
+
+def follow_many(user, author_ids):
+    """Подписывает на авторов; возвращает id новых подписок."""
+    author_ids = set(author_ids) - {user.pk}
+    with transaction.atomic():
+        new_ids = author_ids - set(Follow.objects.filter(
+            user=user, author__in=author_ids
+        ).values_list('author_id', flat=True))
+        if not new_ids:
+            return new_ids
+        Follow.objects.bulk_create(
+            [Follow(user=user, author_id=author_id) for author_id in new_ids],
+            ignore_conflicts=True,
+        )
+        change_counters(new_ids, 'followers_count', 1)
+        change_counter(user.pk, 'following_count', len(new_ids))
+        timelines.followers_changed(new_ids, 1)
+        timelines.add_authors_to_timeline(user.pk, new_ids)
+    bump_feed_versions(f'follow:{user.pk}')
+    purge_pages(*(f'author:{pk}' for pk in new_ids | {user.pk}))
+    return new_ids
+
+
+def unfollow_many(user, author_ids):
+    """Отписывает от авторов; возвращает id снятых подписок."""
+    with transaction.atomic():
+        follows = Follow.objects.filter(user=user, author__in=author_ids)
+        removed_ids = set(follows.values_list('author_id', flat=True))
+        if not removed_ids:
+            return removed_ids
+        # Счётчики и ленты ниже меняются пачкой, а не по строке.
+        with bulk_unfollow():
+            follows.delete()
+        change_counters(removed_ids, 'followers_count', -1)
+        change_counter(user.pk, 'following_count', -len(removed_ids))
+        timelines.followers_changed(removed_ids, -1)
+        timelines.remove_authors_from_timeline(user.pk, removed_ids)
+    bump_feed_versions(f'follow:{user.pk}')
+    purge_pages(*(f'author:{pk}' for pk in removed_ids | {user.pk}))
+    return removed_ids
@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from .images import prepare_upload
 from .models import Comment, Post
 
 
@@ -18,6 +20,12 @@ class PostForm(forms.ModelForm):
             'image': 'Вы можете добавить изображение к вашему посту'
         }
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            return prepare_upload(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
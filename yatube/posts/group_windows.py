@@ -0,0 +1,51 @@
+"""Окно последних постов группы в кеше для первой страницы group_posts.
+
+В кеше лежат id GROUP_WINDOW_SIZE самых новых постов группы, и первая
+страница читается одним `id IN (...)`. Ключ окна содержит версию ленты
+'group:<id>', которую сигналы увеличивают при создании, правке,
+переносе и удалении поста, так что окно не правится на месте и
+параллельные записи не теряют друг друга: после изменения первое
+чтение собирает окно заново.
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+from .caching import CACHE_ALIAS, feed_versions
+from .models import Post
+from .utils import CursorPaginator
+
+WINDOW_KEY = 'group_window:{}:{}'
+
+
+def window_key(group_id):
+    version, = feed_versions([f'group:{group_id}'])
+    return WINDOW_KEY.format(group_id, version)
+
+
+def window_ids(group_id, expected=0):
+    """id новых постов группы; окно короче expected строится заново."""
+    cache = caches[CACHE_ALIAS]
+    key = window_key(group_id)
+    ids = cache.get(key)
+    if ids is None or len(ids) < expected:
+        ids = list(
+            Post.objects.filter(group_id=group_id)
+            .order_by('-pub_date', '-pk')
+            .values_list('pk', flat=True)[:settings.GROUP_WINDOW_SIZE]
+        )
+        cache.set(key, ids, settings.FEED_CACHE_TIMEOUT)
+    return ids
+
+
+def first_page(group, per_page):
+    """Первая страница ленты группы по окну из кеша."""
+    expected = min(group.posts_count, per_page + 1)
+    ids = window_ids(group.pk, expected)[:per_page + 1]
+    posts = group.posts.for_feed().in_bulk(ids)
+    paginator = CursorPaginator(group.posts.for_feed(), per_page)
+    items = [posts[pk] for pk in ids if pk in posts]
+    if len(items) < expected:
+        # Окно разошлось с базой: страница из базы, окно соберётся заново.
+        caches[CACHE_ALIAS].delete(window_key(group.pk))
+        return paginator.page()
+    return paginator.first_page(items)
@@ -0,0 +1,168 @@
+"""Приём картинок постов: проверка, поворот, уменьшение, пережатие.
+
+Загрузки пишутся во временный файл (FILE_UPLOAD_HANDLERS), а не в
+память. До декодирования проверяются размер файла, сигнатура формата
+и число пикселей из заголовка, так что «бомба» из крошечного PNG на
+гигапиксели отсекается до распаковки; у GIF пиксели считаются по всем
+кадрам. Дальше картинка поворачивается по EXIF, теряет EXIF и XMP
+(ICC-профиль остаётся), уменьшается до POST_IMAGE_MAX_SIDE и
+пережимается в тот же формат. Битый файл даёт ошибку формы, а не 500.
+Время каждого шага попадает в гистограмму image_step_duration_seconds
+на /metrics.
+"""
+import os
+import time
+from contextlib import contextmanager
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps
+
+from core.metrics import observe
+
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+)
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'GIF': {},
+}
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp')
+# Ошибки Pillow на повреждённых и подделанных файлах.
+DECODE_ERRORS = (OSError, SyntaxError, Image.DecompressionBombError)
+GIF_IMAGE = b','
+GIF_EXTENSION = b'!'
+
+
+@contextmanager
+def step(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, {
+            'image_step_duration_seconds': time.perf_counter() - started
+        })
+
+
+def sniff_format(upload):
+    upload.seek(0)
+    head = upload.read(12)
+    upload.seek(0)
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'WEBP'
+    for signature, image_format in SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    return None
+
+
+def _skip_sub_blocks(upload):
+    while True:
+        size = upload.read(1)
+        if not size or size == b'\0':
+            return
+        upload.seek(ord(size), os.SEEK_CUR)
+
+
+def _gif_frames(upload, limit):
+    """Число кадров GIF по блокам файла, без распаковки; не больше limit.
+
+    Pillow считает n_frames, декодируя кадры, а это и есть то, от чего
+    защищает проверка.
+    """
+    upload.seek(10)
+    flags = upload.read(3)[:1]
+    if flags and ord(flags) & 0x80:
+        upload.seek(3 * 2 ** ((ord(flags) & 7) + 1), os.SEEK_CUR)
+    frames = 0
+    while frames <= limit:
+        block = upload.read(1)
+        if block == GIF_IMAGE:
+            descriptor = upload.read(9)
+            if len(descriptor) == 9 and descriptor[8] & 0x80:
+                upload.seek(3 * 2 ** ((descriptor[8] & 7) + 1), os.SEEK_CUR)
+            upload.read(1)
+            _skip_sub_blocks(upload)
+            frames += 1
+        elif block == GIF_EXTENSION:
+            upload.read(1)
+            _skip_sub_blocks(upload)
+        else:
+            break
+    return frames
+
+
+def _check(upload):
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)d МБ.',
+            params={'limit': settings.POST_IMAGE_MAX_BYTES // 2 ** 20},
+        )
+    image_format = sniff_format(upload)
+    if image_format not in SAVE_OPTIONS:
+        raise ValidationError('Поддерживаются JPEG, PNG и GIF.')
+    # Image.open читает только заголовок, пиксели ещё не распакованы.
+    try:
+        with Image.open(upload) as image:
+            width, height = image.size
+    except DECODE_ERRORS:
+        raise ValidationError('Файл повреждён или не является картинкой.')
+    pixels = width * height
+    if pixels > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError('Слишком большое разрешение картинки.')
+    if image_format == 'GIF':
+        limit = settings.POST_IMAGE_MAX_PIXELS // max(pixels, 1)
+        frames = _gif_frames(upload, limit)
+        if frames * pixels > settings.POST_IMAGE_MAX_PIXELS:
+            raise ValidationError('Слишком много кадров в анимации.')
+    upload.seek(0)
+    return image_format
+
+
+def _encode(image, image_format, upload):
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    for key in METADATA_KEYS:
+        image.info.pop(key, None)
+    options = dict(SAVE_OPTIONS[image_format])
+    if image.info.get('icc_profile'):
+        # Без профиля фото в Display P3 покажутся с другими цветами.
+        options['icc_profile'] = image.info['icc_profile']
+    # Небольшой результат остаётся в памяти, крупный уходит на диск.
+    output = SpooledTemporaryFile(settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    image.save(output, format=image_format, **options)
+    size = output.tell()
+    output.seek(0)
+    return UploadedFile(
+        output, os.path.basename(upload.name), upload.content_type, size
+    )
+
+
+def prepare_upload(upload):
+    """Проверенная и нормализованная копия загруженной картинки."""
+    with step('validate'):
+        image_format = _check(upload)
+    try:
+        with Image.open(upload) as image:
+            if getattr(image, 'is_animated', False):
+                # Пережатие оставило бы от анимации первый кадр.
+                upload.seek(0)
+                return upload
+            with step('decode'):
+                image.load()
+            with step('orient'):
+                image = ImageOps.exif_transpose(image)
+            with step('resize'):
+                side = settings.POST_IMAGE_MAX_SIDE
+                image.thumbnail((side, side), Image.LANCZOS)
+            with step('encode'):
+                return _encode(image, image_format, upload)
+    except DECODE_ERRORS:
+        raise ValidationError('Файл повреждён или не является картинкой.')
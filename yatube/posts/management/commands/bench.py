@@ -0,0 +1,330 @@
+import json
+import random
+import statistics
+import time
+from urllib.parse import quote, urlsplit
+from datetime import datetime, timezone
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import resolve, reverse
+from faker import Faker
+
+from core.metrics import RequestTimings
+from posts import urls
+from posts.caching import CACHE_ALIAS
+from posts.models import Comment, Follow, Group, Post, User
+from posts.page_cache import page_key
+
+# Тексты берутся из заранее сгенерированного пула: Faker на миллионах
+# записей медленнее самой вставки.
+TEXT_POOL_SIZE = 2000
+GROUPS_COUNT = 100
+
+
+def percentile(values, share):
+    """Значение по методу ближайшего ранга из отсортированного списка."""
+    index = max(0, round(share * len(values) + 0.5) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон всех URL из posts/urls.py: пропускная '
+        'способность, p50/p99 и число SQL-запросов в JSON. С --seed '
+        'сначала наполняет базу данными Faker в заданных объёмах. '
+        'Страницы из кеша гостей меряются без него, попадания в кеш '
+        'выводятся отдельно (hot).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', action='store_true',
+            help='Наполнить базу перед замером. Непустую базу — только '
+                 'вместе с --yes-really.',
+        )
+        parser.add_argument(
+            '--yes-really', action='store_true',
+            help='Подтвердить наполнение базы, в которой уже есть посты.',
+        )
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--follows', type=int, default=10_000_000)
+        parser.add_argument('--comments', type=int, default=5_000_000)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Запросов на каждый URL.',
+        )
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--output', default='bench.json')
+        parser.add_argument(
+            '--compare', metavar='PATH',
+            help='Прошлый результат: упасть, если p50 вырос больше порога.',
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый рост p50 при --compare, доля.',
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests должно быть больше нуля.')
+        if options['seed']:
+            self.check_seed_target(options['yes_really'])
+            self.seed(options)
+        self.fixtures = self.pick_fixtures()
+        results = {}
+        for pattern in urls.urlpatterns:
+            name = f'{urls.app_name}:{pattern.name}'
+            results[name] = self.measure(
+                name, options['requests'], options['warmup']
+            )
+            result = results[name]
+            hot = (
+                f', из кеша p50={result["hot"]["p50_ms"]:.1f} мс'
+                if 'hot' in result else ''
+            )
+            self.stdout.write(
+                f'{name}: {result["rps"]:.1f} rps, '
+                f'p50={result["p50_ms"]:.1f} мс, '
+                f'p99={result["p99_ms"]:.1f} мс, '
+                f'SQL={result["queries"]}{hot}'
+            )
+        self.restore_follow()
+        report = {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'volumes': {
+                model.__name__: model.objects.count()
+                for model in (User, Post, Follow, Comment)
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты записаны в {options["output"]}'
+        ))
+        if options['compare']:
+            self.compare(results, options['compare'], options['threshold'])
+
+    def check_seed_target(self, confirmed):
+        """Не пишет миллионы строк в рабочую базу без подтверждения."""
+        if confirmed or not Post.objects.exists():
+            return
+        raise CommandError(
+            f'В базе {connection.settings_dict["NAME"]} уже есть посты. '
+            f'Наполнение добавит миллионы строк; если это действительно '
+            f'тестовая база, добавьте --yes-really.'
+        )
+
+    def seed(self, options):
+        fake = Faker('ru_RU')
+        texts = [fake.paragraph() for _ in range(TEXT_POOL_SIZE)]
+        batch_size = options['batch_size']
+        # Хеш пароля дорогой: один на всех пользователей.
+        password = make_password('bench-password')
+        first_user = (User.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0) + 1
+        self.bulk(User, batch_size, (
+            User(username=f'bench{first_user + number}',
+                 first_name=fake.first_name(), password=password)
+            for number in range(options['users'])
+        ))
+        user_ids = list(User.objects.values_list('pk', flat=True))
+        self.bulk(Group, batch_size, (
+            Group(title=fake.word(), slug=f'bench-{first_user}-{number}',
+                  description=fake.sentence())
+            for number in range(GROUPS_COUNT)
+        ))
+        group_ids = list(Group.objects.values_list('pk', flat=True))
+        self.bulk(Post, batch_size, (
+            Post(text=random.choice(texts),
+                 author_id=self.skewed(user_ids),
+                 group_id=random.choice(group_ids)
+                 if random.random() < 0.5 else None)
+            for _ in range(options['posts'])
+        ))
+        post_range = Post.objects.order_by('pk').values_list('pk', flat=True)
+        first_post, last_post = post_range.first(), post_range.last()
+        self.bulk(Follow, batch_size, (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in (
+                (random.choice(user_ids), self.skewed(user_ids))
+                for _ in range(options['follows'])
+            )
+            if user_id != author_id
+        ))
+        self.bulk(Comment, batch_size, (
+            Comment(post_id=random.randint(first_post, last_post),
+                    author_id=random.choice(user_ids),
+                    text=random.choice(texts)[:200])
+            for _ in range(options['comments'])
+        ))
+        for command in ('reconcile_stats', 'rebuild_timelines',
+                        'rebuild_search_index', 'build_recommendations'):
+            call_command(command, stdout=self.stdout)
+
+    def skewed(self, ids):
+        # Немногие авторы пишут и собирают подписчиков больше остальных.
+        return ids[int(len(ids) * random.random() ** 3)]
+
+    def bulk(self, model, batch_size, objects):
+        started = time.monotonic()
+        created = 0
+        while True:
+            batch = [obj for _, obj in zip(range(batch_size), objects)]
+            if not batch:
+                break
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            created += len(batch)
+            self.stdout.write(
+                f'{model.__name__}: {created} '
+                f'({created / (time.monotonic() - started):.0f} в секунду)'
+            )
+
+    def pick_fixtures(self):
+        post = Post.objects.select_related('author').order_by('-pk').first()
+        group = Group.objects.order_by('pk').first()
+        follow = Follow.objects.order_by('pk').first()
+        if post is None or group is None or follow is None:
+            raise CommandError(
+                'Нужны хотя бы один пост, группа и подписка: '
+                'запустите с --seed.'
+            )
+        author_client = Client()
+        author_client.force_login(post.author)
+        reader_client = Client()
+        reader_client.force_login(follow.user)
+        return {
+            'post': post,
+            'group': group,
+            'follow': follow,
+            'author_client': author_client,
+            'reader_client': reader_client,
+            'guest_client': Client(),
+        }
+
+    def case(self, name):
+        """Клиент, путь и подготовка (вне замера) для URL по имени."""
+        f = self.fixtures
+        post, follow = f['post'], f['follow']
+        author = follow.author.username
+        cases = {
+            'posts:index': ('guest_client', []),
+            'posts:group_list': ('guest_client', [f['group'].slug]),
+            'posts:profile': ('guest_client', [post.author.username]),
+            'posts:search': ('guest_client', []),
+            'posts:post_detail': ('guest_client', [post.pk]),
+            'posts:post_create': ('author_client', []),
+            'posts:post_edit': ('author_client', [post.pk]),
+            'posts:add_comment': ('reader_client', [post.pk]),
+            'posts:follow_index': ('reader_client', []),
+            'posts:feed_index': ('guest_client', ['atom']),
+            'posts:feed_group': ('guest_client', [f['group'].slug, 'rss']),
+            'posts:feed_profile': ('guest_client', [author, 'json']),
+            # Подписка и отписка каждый раз действительно меняют базу.
+            'posts:profile_follow': (
+                'reader_client', [author], self.unfollow
+            ),
+            'posts:profile_unfollow': (
+                'reader_client', [author], self.restore_follow
+            ),
+        }
+        if name not in cases:
+            raise CommandError(f'Для {name} не описан сценарий замера.')
+        client, args, *prepare = cases[name]
+        path = reverse(name, args=args)
+        if name == 'posts:search':
+            path += '?q=' + quote((post.text.split() or ['пост'])[0])
+        return f[client], path, prepare[0] if prepare else None
+
+    def unfollow(self):
+        follow = self.fixtures['follow']
+        Follow.objects.filter(
+            user=follow.user, author=follow.author
+        ).delete()
+
+    def restore_follow(self):
+        follow = self.fixtures['follow']
+        Follow.objects.get_or_create(user=follow.user, author=follow.author)
+
+    def measure(self, name, requests, warmup):
+        """Замер view; для кеша страниц гостей — ещё и попадания в него.
+
+        Основные цифры (и --compare) — без кеша страниц, иначе бы
+        мерились только чтения из кеша.
+        """
+        client, path, prepare = self.case(name)
+        view = resolve(urlsplit(path).path).func
+        if (client is not self.fixtures['guest_client']
+                or not getattr(view, 'page_cached', False)):
+            return self.run(client, path, prepare, requests, warmup)
+        # Первый запрос кладёт страницу в кеш, его не считаем.
+        hot = self.run(client, path, prepare, requests, max(warmup, 1))
+        key = page_key(path)
+
+        def evict():
+            if prepare:
+                prepare()
+            caches[CACHE_ALIAS].delete(key)
+
+        result = self.run(client, path, evict, requests, warmup)
+        result['hot'] = {
+            field: hot[field]
+            for field in ('rps', 'p50_ms', 'p99_ms', 'queries')
+        }
+        return result
+
+    def run(self, client, path, prepare, requests, warmup):
+        latencies, queries = [], []
+        statuses = set()
+        for number in range(warmup + requests):
+            if prepare:
+                prepare()
+            timings = RequestTimings()
+            started = time.perf_counter()
+            with connection.execute_wrapper(timings):
+                response = client.get(path)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+            if number >= warmup:
+                latencies.append(elapsed)
+                queries.append(timings.queries)
+                statuses.add(response.status_code)
+        latencies.sort()
+        return {
+            'path': path,
+            'requests': requests,
+            'statuses': sorted(statuses),
+            'rps': requests / sum(latencies),
+            'mean_ms': statistics.mean(latencies) * 1000,
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'queries': max(queries),
+        }
+
+    def compare(self, results, path, threshold):
+        with open(path, encoding='utf-8') as previous_file:
+            previous = json.load(previous_file)['results']
+        regressions = []
+        for name, result in results.items():
+            before = previous.get(name)
+            if before is None:
+                continue
+            growth = result['p50_ms'] / before['p50_ms'] - 1
+            self.stdout.write(
+                f'{name}: p50 {before["p50_ms"]:.1f} -> '
+                f'{result["p50_ms"]:.1f} мс ({growth:+.0%}), '
+                f'SQL {before["queries"]} -> {result["queries"]}'
+            )
+            if growth > threshold or result['queries'] > before['queries']:
+                regressions.append(name)
+        if regressions:
+            raise CommandError(f'Регрессия: {", ".join(regressions)}')
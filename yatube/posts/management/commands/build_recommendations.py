@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts.recommendations import build_recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рекомендации «кого почитать» по графу подписок. '
+        'Запускается периодически, например из cron раз в сутки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top', type=int,
+            help='Сколько авторов хранить на пользователя.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        users = build_recommendations(
+            options['top'], batch_size=options['batch_size']
+        )
+        self.stdout.write(f'Пересчитаны рекомендации: {users}')
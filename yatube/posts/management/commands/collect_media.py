@@ -0,0 +1,92 @@
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from core.db_router import use_primary
+from posts.models import Post
+
+CHUNK_SIZE = 500
+
+
+def stored_files(storage, directory):
+    """Все файлы каталога хранилища вместе с подкаталогами."""
+    directories, files = storage.listdir(directory)
+    for filename in files:
+        yield os.path.join(directory, filename)
+    for subdirectory in directories:
+        yield from stored_files(storage, os.path.join(directory, subdirectory))
+
+
+def reference_counts(names):
+    """{имя файла: число постов с ним} для файлов из names."""
+    counts = dict.fromkeys(names, 0)
+    counts.update(
+        Post.objects.filter(image__in=names).order_by()
+        .values_list('image').annotate(Count('pk'))
+    )
+    return counts
+
+
+def is_fresh(storage, name, deadline):
+    """Файл моложе срока или уже удалён другим запуском команды."""
+    try:
+        return storage.get_modified_time(name) > deadline
+    except FileNotFoundError:
+        return True
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки постов, на которые не ссылается ни один пост, '
+        'вместе с их миниатюрами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=settings.MEDIA_GC_GRACE_SECONDS,
+            help='Не трогать файлы моложе стольких секунд.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что было бы удалено.',
+        )
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        storage = field.storage
+        directory = field.upload_to.rstrip('/')
+        files = (
+            list(stored_files(storage, directory))
+            if storage.exists(directory) else []
+        )
+        deadline = timezone.now() - timedelta(seconds=options['grace'])
+        removed = 0
+        # Реплика может ещё не знать о новом посте. Загрузка пишет файл
+        # раньше строки Post, и между ними файл бережёт только срок
+        # --grace (см. posts.storage).
+        with use_primary():
+            for start in range(0, len(files), CHUNK_SIZE):
+                counts = reference_counts(files[start:start + CHUNK_SIZE])
+                for name, count in counts.items():
+                    if count or is_fresh(storage, name, deadline):
+                        continue
+                    if options['dry_run']:
+                        removed += 1
+                        self.stdout.write(name)
+                        continue
+                    # Пока шла пачка, файл могли загрузить заново.
+                    if (Post.objects.filter(image=name).exists()
+                            or is_fresh(storage, name, deadline)):
+                        continue
+                    removed += 1
+                    image = ImageFile(name, storage)
+                    default.kvstore.delete_thumbnails(image)
+                    default.kvstore.delete(image)
+                    storage.delete(name)
+        self.stdout.write(f'Файлов без ссылок: {removed} из {len(files)}')
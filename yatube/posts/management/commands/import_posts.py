@@ -0,0 +1,226 @@
+import csv
+import json
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts.caching import bump_all_feeds
+from posts.models import Comment, Follow, Group, Post, User
+
+RECORD_TYPES = ('post', 'comment', 'follow')
+# Ошибки разбора одной записи: она пропускается с номером строки.
+RECORD_ERRORS = (KeyError, ValueError)
+
+
+def reset_post_sequence():
+    """После вставки с явными id счётчик id идёт дальше них, как в loaddata.
+
+    Иначе PostgreSQL выдаст следующему посту уже занятый id.
+    """
+    connection = connections[router.db_for_write(Post)]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Post]):
+            cursor.execute(sql)
+
+
+@contextmanager
+def keep_pub_dates():
+    """На время вставки auto_now_add не перетирает даты из файла."""
+    field = Post._meta.get_field('pub_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует посты, комментарии и подписки из JSONL или CSV '
+        'пачками через bulk_create. Авторы и группы ищутся по username '
+        'и slug, даты постов берутся из файла, битые записи пропускаются '
+        'с номером строки. Сигналы при этом не срабатывают: после импорта '
+        'запустите rebuild_timelines, reconcile_stats и '
+        'rebuild_search_index.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл .jsonl или .csv.')
+        parser.add_argument('--format', choices=('jsonl', 'csv'))
+        parser.add_argument(
+            '--type', choices=RECORD_TYPES, dest='record_type',
+            help='Тип записей CSV-файла; в JSONL он в поле "type".',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--offset', type=int, default=0,
+            help='Пропустить первые N записей (продолжение импорта).',
+        )
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or (
+            'csv' if options['path'].endswith('.csv') else 'jsonl'
+        )
+        if fmt == 'csv' and not options['record_type']:
+            raise CommandError('Для CSV укажите --type.')
+        self.users = {}
+        self.groups = {}
+        offset = options['offset']
+        imported = skipped = 0
+        started = time.monotonic()
+        with open(options['path'], encoding='utf-8', newline='') as source:
+            records = islice(
+                self.read_records(source, fmt, options['record_type']),
+                offset, None
+            )
+            while True:
+                batch = list(islice(records, options['batch_size']))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    created = self.import_batch(batch)
+                offset += len(batch)
+                imported += created
+                skipped += len(batch) - created
+                rate = (imported + skipped) / (time.monotonic() - started)
+                self.stdout.write(
+                    f'offset={offset} импортировано={imported} '
+                    f'пропущено={skipped} ({rate:.0f} записей/с)'
+                )
+        reset_post_sequence()
+        bump_all_feeds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {imported} записей, продолжить можно с '
+            f'--offset {offset}. Запустите rebuild_timelines, '
+            f'reconcile_stats и rebuild_search_index.'
+        ))
+
+    def read_records(self, source, fmt, record_type):
+        """(номер строки, тип, запись); вместо битой записи — ошибка."""
+        if fmt == 'csv':
+            reader = csv.DictReader(source)
+            for row in reader:
+                yield reader.line_num, record_type, row
+            return
+        for number, line in enumerate(source, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError('ожидался объект JSON')
+            except ValueError as error:
+                yield number, None, error
+                continue
+            yield number, record.pop('type', record_type), record
+
+    def report(self, number, error):
+        self.stderr.write(
+            f'Строка {number} пропущена: {type(error).__name__}: {error}'
+        )
+
+    def build(self, records, make):
+        """Объекты из записей; запись с ошибкой попадает в отчёт."""
+        objects = []
+        for number, record in records:
+            try:
+                obj = make(record)
+            except RECORD_ERRORS as error:
+                self.report(number, error)
+                continue
+            if obj is not None:
+                objects.append(obj)
+        return objects
+
+    def resolve(self, cache, model, field, values):
+        """Дозагружает в кеш id по username/slug одним запросом."""
+        missing = {value for value in values if value and value not in cache}
+        if missing:
+            found = dict(model.objects.filter(
+                **{f'{field}__in': missing}
+            ).values_list(field, 'pk'))
+            for value in missing:
+                cache[value] = found.get(value)
+        return cache
+
+    def import_batch(self, batch):
+        by_type = {record_type: [] for record_type in RECORD_TYPES}
+        for number, record_type, record in batch:
+            if isinstance(record, Exception):
+                self.report(number, record)
+            elif record_type in by_type:
+                by_type[record_type].append((number, record))
+        self.resolve(self.users, User, 'username', (
+            record.get(field)
+            for records in by_type.values() for _, record in records
+            for field in ('author', 'user')
+        ))
+        self.resolve(self.groups, Group, 'slug', (
+            record.get('group') for _, record in by_type['post']
+        ))
+        return (
+            self.import_posts(by_type['post'])
+            + self.import_comments(by_type['comment'])
+            + self.import_follows(by_type['follow'])
+        )
+
+    def import_posts(self, records):
+        now = timezone.now()
+
+        def make(record):
+            if not self.users.get(record.get('author')):
+                return None
+            return Post(
+                pk=int(record['id']) if record.get('id') else None,
+                text=record['text'],
+                author_id=self.users[record['author']],
+                group_id=self.groups.get(record.get('group')),
+                image=record.get('image') or '',
+                pub_date=parse_datetime(record.get('pub_date') or '') or now,
+            )
+
+        posts = self.build(records, make)
+        with keep_pub_dates():
+            Post.objects.bulk_create(posts)
+        return len(posts)
+
+    def import_comments(self, records):
+        wanted = {str(record.get('post')) for _, record in records}
+        post_ids = set(Post.objects.filter(
+            pk__in=[post_id for post_id in wanted if post_id.isdigit()]
+        ).values_list('pk', flat=True))
+
+        def make(record):
+            if (not self.users.get(record.get('author'))
+                    or int(record.get('post') or 0) not in post_ids):
+                return None
+            return Comment(
+                post_id=int(record['post']),
+                author_id=self.users[record['author']],
+                text=record['text'],
+            )
+
+        comments = self.build(records, make)
+        Comment.objects.bulk_create(comments)
+        return len(comments)
+
+    def import_follows(self, records):
+        def make(record):
+            if (not self.users.get(record.get('user'))
+                    or not self.users.get(record.get('author'))
+                    or record['user'] == record['author']):
+                return None
+            return Follow(
+                user_id=self.users[record['user']],
+                author_id=self.users[record['author']],
+            )
+
+        follows = self.build(records, make)
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        return len(follows)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Follow, User
+from posts.timelines import rebuild_timeline
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок (TimelineEntry) по таблице Follow.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', action='append', dest='users', metavar='USERNAME',
+            help='Пересобрать только ленту этого пользователя.',
+        )
+
+    def handle(self, *args, **options):
+        if options['users']:
+            user_ids = User.objects.filter(
+                username__in=options['users']
+            ).values_list('pk', flat=True)
+        else:
+            user_ids = Follow.objects.order_by().values_list(
+                'user_id', flat=True
+            ).distinct()
+        rebuilt = 0
+        for user_id in user_ids.iterator():
+            rebuild_timeline(user_id)
+            rebuilt += 1
+        self.stdout.write(f'Пересобрано лент: {rebuilt}')
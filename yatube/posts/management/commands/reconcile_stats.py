@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import User
+from posts.stats import reconcile_group_counts, reconcile_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счётчики UserStats и Group.posts_count с таблицами '
+        'и чинит расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', action='append', dest='users', metavar='USERNAME',
+            help='Сверить только счётчики этого пользователя.',
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['users']:
+            users = users.filter(username__in=options['users'])
+        fixed = reconcile_stats(users)
+        self.stdout.write(f'Исправлено счётчиков: {fixed}')
+        if not options['users']:
+            fixed = reconcile_group_counts()
+            self.stdout.write(f'Исправлено счётчиков групп: {fixed}')
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.thumbnails import enqueue_missing_thumbnails, run_thumbnail_tasks
+
+
+class Command(BaseCommand):
+    help = 'Фоновый воркер: строит миниатюры картинок постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить накопившиеся задачи и завершиться.',
+        )
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help='Сначала поставить задачи для всех постов с картинками.',
+        )
+        parser.add_argument('--batch', type=int, default=20)
+        parser.add_argument(
+            '--sleep', type=float, default=2.0,
+            help='Пауза в секундах, когда очередь пуста.',
+        )
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            enqueue_missing_thumbnails()
+        total = 0
+        while True:
+            processed = run_thumbnail_tasks(options['batch'])
+            total += processed
+            if processed:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+        self.stdout.write(f'Обработано задач: {total}')
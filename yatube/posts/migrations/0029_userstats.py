@@ -0,0 +1,30 @@
+# Generated by Django 2.2.16 on 2026-10-18 16:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0028_auto_20261018_1651'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Посты')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчики')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписки')),
+                ('comments_count', models.PositiveIntegerField(default=0, verbose_name='Комментарии')),
+            ],
+            options={
+                'verbose_name': 'Статистика пользователя',
+                'verbose_name_plural': 'Статистика пользователей',
+            },
+        ),
+    ]
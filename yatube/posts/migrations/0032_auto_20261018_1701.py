@@ -0,0 +1,42 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0031_thumbnailtask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='posts.Post', verbose_name='Пост')),
+                ('length', models.PositiveIntegerField(default=0, verbose_name='Число слов')),
+            ],
+            options={
+                'verbose_name': 'Документ поиска',
+                'verbose_name_plural': 'Документы поиска',
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Основа слова')),
+                ('frequency', models.PositiveIntegerField(default=1, verbose_name='Частота')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_postings', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Вхождение слова',
+                'verbose_name_plural': 'Вхождения слов',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchposting',
+            constraint=models.UniqueConstraint(fields=('term', 'post'), name='unique_search_posting'),
+        ),
+    ]
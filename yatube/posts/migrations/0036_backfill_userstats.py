@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = {
+    'posts_count': ('Post', 'author'),
+    'followers_count': ('Follow', 'author'),
+    'following_count': ('Follow', 'user'),
+    'comments_count': ('Comment', 'author'),
+}
+BATCH_SIZE = 500
+
+
+def backfill_user_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserStats = apps.get_model('posts', 'UserStats')
+    annotations = {}
+    for field, (model_name, user_field) in COUNTERS.items():
+        counts = apps.get_model('posts', model_name).objects.filter(
+            **{user_field: OuterRef('pk')}
+        ).order_by().values(user_field).annotate(total=Count('pk'))
+        annotations[field] = Coalesce(Subquery(counts.values('total')), 0)
+    users = User.objects.exclude(
+        pk__in=UserStats.objects.values('user')
+    ).annotate(**annotations).values('pk', *COUNTERS)
+    batch = []
+    for user in users.iterator():
+        batch.append(UserStats(user_id=user.pop('pk'), **user))
+        if len(batch) == BATCH_SIZE:
+            UserStats.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    UserStats.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0035_auto_20261018_1729'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_user_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0036_backfill_userstats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='searchposting',
+            index=models.Index(fields=['term', '-frequency'], name='search_term_frequency_idx'),
+        ),
+    ]
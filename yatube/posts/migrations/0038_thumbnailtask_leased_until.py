@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0037_search_term_frequency_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thumbnailtask',
+            name='leased_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Занята до'),
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth import get_user_model
 
 from core.models import CreatedModel, PubDateModel
+from .storage import ContentAddressedStorage
 
 
 User = get_user_model()
@@ -19,6 +20,10 @@ class Group(models.Model):
         'Описание группы',
         help_text='Добавьте описание новой группы'
     )
+    # Ведётся сигналами, чтобы не считать COUNT на каждой странице.
+    posts_count = models.PositiveIntegerField(
+        'Число постов', default=0, editable=False
+    )
 
     class Meta:
         verbose_name = 'Группа'
@@ -28,6 +33,12 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты с тем, что читают шаблоны лент, без запросов в цикле."""
+        return self.select_related('author', 'group')
+
+
 class Post(PubDateModel):
     text = models.TextField(
         'Текст поста',
@@ -50,15 +61,28 @@ class Post(PubDateModel):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
         help_text='Вы можете добавить изображение к вашему посту'
     )
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         default_related_name = 'posts'
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
         ordering = ['-pub_date']
+        # Ленты идут по (pub_date, id) в обратном порядке: индексы читаются
+        # с конца и отдают нужный порядок без сортировки.
+        indexes = [
+            models.Index(fields=['pub_date', 'id'],
+                         name='post_pub_date_idx'),
+            models.Index(fields=['author', 'pub_date', 'id'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', 'pub_date', 'id'],
+                         name='post_group_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:MAX_SYMBOLS_STR_POST]
@@ -84,6 +108,8 @@ class Comment(CreatedModel):
 
     class Meta:
         ordering = ['-created']
+        indexes = [models.Index(fields=['post', 'created', 'id'],
+                                name='comment_post_created_idx')]
 
     def __str__(self) -> str:
         return self.text
@@ -107,3 +133,141 @@ class Follow(CreatedModel):
         ordering = ['-author']
         constraints = [models.UniqueConstraint(fields=['user', 'author'],
                                                name='unique_following')]
+        # Подписчики автора читаются только из индекса, без таблицы.
+        indexes = [models.Index(fields=['author', 'user'],
+                                name='follow_author_user_idx')]
+
+
+class TimelineEntry(models.Model):
+    """Пост в ленте подписок читателя, записанный при публикации."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    # Копия Post.pub_date, чтобы лента читалась по индексу без join.
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        ordering = ['-pub_date']
+        constraints = [models.UniqueConstraint(fields=['user', 'post'],
+                                               name='unique_timeline_entry')]
+        indexes = [models.Index(fields=['user', 'pub_date', 'post'],
+                                name='timeline_user_pub_date_idx')]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, которые ведутся сигналами, а не COUNT."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Посты', default=0)
+    followers_count = models.PositiveIntegerField('Подписчики', default=0)
+    following_count = models.PositiveIntegerField('Подписки', default=0)
+    comments_count = models.PositiveIntegerField('Комментарии', default=0)
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self):
+        return f'Статистика {self.user_id}'
+
+
+class ThumbnailTask(CreatedModel):
+    """Задача фонового воркера: построить миниатюры картинки поста."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='thumbnail_tasks',
+        verbose_name='Пост',
+    )
+    attempts = models.PositiveSmallIntegerField('Попытки', default=0)
+    # До этого времени задачу выполняет забравший её воркер.
+    leased_until = models.DateTimeField('Занята до', null=True, blank=True)
+    error = models.TextField('Ошибка', blank=True)
+
+    class Meta:
+        verbose_name = 'Задача миниатюр'
+        verbose_name_plural = 'Задачи миниатюр'
+        ordering = ['created']
+
+    def __str__(self):
+        return f'Миниатюры поста {self.post_id}'
+
+
+class SearchDocument(models.Model):
+    """Пост в поисковом индексе: длина текста в словах для BM25."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document',
+        verbose_name='Пост',
+    )
+    length = models.PositiveIntegerField('Число слов', default=0)
+
+    class Meta:
+        verbose_name = 'Документ поиска'
+        verbose_name_plural = 'Документы поиска'
+
+
+class SearchPosting(models.Model):
+    """Основа слова и сколько раз она встречается в посте."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_postings',
+        verbose_name='Пост',
+    )
+    term = models.CharField('Основа слова', max_length=64)
+    frequency = models.PositiveIntegerField('Частота', default=1)
+
+    class Meta:
+        verbose_name = 'Вхождение слова'
+        verbose_name_plural = 'Вхождения слов'
+        constraints = [models.UniqueConstraint(fields=['term', 'post'],
+                                               name='unique_search_posting')]
+        # Верх списка по частоте для частых основ читается по индексу.
+        indexes = [models.Index(fields=['term', '-frequency'],
+                                name='search_term_frequency_idx')]
+
+
+class Recommendation(models.Model):
+    """Автор, которого стоит почитать; считает build_recommendations."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recommendations',
+        verbose_name='Пользователь',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    score = models.FloatField('Оценка')
+
+    class Meta:
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+        constraints = [models.UniqueConstraint(fields=['user', 'author'],
+                                               name='unique_recommendation')]
+        indexes = [
+            models.Index(fields=['user', '-score'],
+                         name='recommendation_user_score_idx'),
+        ]
@@ -0,0 +1,68 @@
+"""Кеш целых страниц для гостей с суррогатными ключами.
+
+Гость получает сохранённый ответ без шаблонов и запросов к базе.
+Страница помечена суррогатными ключами: 'index', 'group:<id>',
+'profile:<id>', 'post:<id>', 'author:<id>' и общий 'groups'. Ключи —
+это версии из posts.caching: вместе с телом хранятся их значения на
+момент рендеринга, сигналы увеличивают версии, и запись с устаревшей
+версией считается промахом. Так сбрасываются ровно затронутые
+страницы, а CDN получает те же ключи в заголовке Surrogate-Key.
+"""
+from functools import wraps
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from .caching import CACHE_ALIAS, bump_feed_versions, feed_versions
+
+PAGE_KEY = 'page:{}'
+
+
+def page_key(path):
+    """Ключ кеша страницы по пути вместе со строкой запроса."""
+    return PAGE_KEY.format(md5(path.encode()).hexdigest())
+
+
+def surrogate_keys(request, *keys):
+    """Ключи страницы; названия групп видны на всех страницах."""
+    request.surrogate_keys = keys + ('groups',)
+
+
+def purge_pages(*keys):
+    bump_feed_versions(*keys)
+
+
+def _tagged(response, keys):
+    response['Surrogate-Key'] = ' '.join(keys)
+    return response
+
+
+def cache_anonymous_page(view):
+    """Отдаёт гостям сохранённую страницу, пока версии её ключей те же."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (request.method not in ('GET', 'HEAD')
+                or request.user.is_authenticated):
+            return view(request, *args, **kwargs)
+        cache = caches[CACHE_ALIAS]
+        key = page_key(request.get_full_path())
+        entry = cache.get(key)
+        if entry is not None:
+            keys, versions, content, content_type = entry
+            if feed_versions(keys) == versions:
+                response = HttpResponse(content, content_type=content_type)
+                return _tagged(response, keys)
+        response = view(request, *args, **kwargs)
+        keys = getattr(request, 'surrogate_keys', None)
+        if keys and response.status_code == 200 and not response.streaming:
+            cache.set(key, (
+                keys, feed_versions(keys),
+                response.content, response['Content-Type'],
+            ), settings.PAGE_CACHE_TIMEOUT)
+            _tagged(response, keys)
+        return response
+    # По метке bench находит страницы, которые нужно мерить без кеша.
+    wrapper.page_cached = True
+    return wrapper
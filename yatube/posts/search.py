@@ -0,0 +1,159 @@
+"""Полнотекстовый поиск по постам на обратном индексе в БД.
+
+Текст разбивается на слова, служебные слова отбрасываются, остальные
+приводятся к основе простым стеммером для русского и английского. Для
+каждого поста хранится длина (SearchDocument) и частоты основ
+(SearchPosting); индекс обновляется сигналами, когда меняется текст
+поста, а удаление снимается каскадом. Результаты ранжируются по BM25.
+Для частой основы читаются не больше SEARCH_POSTINGS_PER_TERM постов,
+где она встречается чаще всего, — так запрос не тянет в память весь
+индекс.
+"""
+import math
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count
+
+from .models import Post, SearchDocument, SearchPosting
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+CYRILLIC_RE = re.compile('[а-я]')
+MIN_STEM_LENGTH = 3
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 10
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Окончания отсортированы по убыванию длины: отрезается самое длинное.
+RUSSIAN_ENDINGS = sorted({
+    'иями', 'ями', 'ами', 'ией', 'ием', 'иях', 'ого', 'его', 'ому', 'ему',
+    'ыми', 'ими', 'ешь', 'ете', 'ишь', 'ите', 'ать', 'ять', 'ить', 'еть',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ый', 'ий', 'ой', 'ей', 'ых', 'их',
+    'ым', 'им',
+    'ую', 'юю', 'ом', 'ем', 'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ию',
+    'ия', 'ть', 'ет', 'ит', 'ут', 'ют', 'ат', 'ят', 'ла',
+    'ло', 'ли', 'ся', 'сь', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь',
+    'й',
+}, key=len, reverse=True)
+ENGLISH_ENDINGS = sorted({
+    'ational', 'ization', 'fulness', 'ousness', 'iveness', 'ingly',
+    'edly', 'ness', 'ment', 'ing', 'ies', 'ied', 'ed', 'ly', 'es', 's',
+}, key=len, reverse=True)
+
+
+STOP_WORDS = frozenset('''
+    а без более бы был была были было быть в вам вас вот все всего всех
+    вы где да даже для до его ее ей если есть еще же за здесь и из или им
+    их к как ко когда кто ли меня мне мы на над нас не него нее нет ни
+    них но ну о об он она они оно от по под после при про с со так также
+    там те тем то того тоже только тот ты у уже чем что чтобы эта эти это
+    этот я
+    a an and are as at be been but by for from has have if in into is it
+    its no not of on or so such that the their then there these they
+    this to was were will with
+'''.split())
+
+
+def stem(word):
+    endings = RUSSIAN_ENDINGS if CYRILLIC_RE.search(word) else ENGLISH_ENDINGS
+    for ending in endings:
+        if (word.endswith(ending)
+                and len(word) - len(ending) >= MIN_STEM_LENGTH):
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text):
+    """Основы слов текста в нижнем регистре, ё приведена к е."""
+    return [
+        stem(word)[:MAX_TERM_LENGTH]
+        for word in WORD_RE.findall(text.lower().replace('ё', 'е'))
+        if word not in STOP_WORDS
+    ]
+
+
+def index_post(post):
+    """Перестраивает записи индекса одного поста."""
+    terms = Counter(tokenize(post.text))
+    SearchPosting.objects.filter(post=post).delete()
+    SearchDocument.objects.update_or_create(
+        post=post, defaults={'length': sum(terms.values())}
+    )
+    SearchPosting.objects.bulk_create(
+        SearchPosting(post=post, term=term, frequency=frequency)
+        for term, frequency in terms.items()
+    )
+
+
+@transaction.atomic
+def rebuild_index(batch_size=1000):
+    """Индексирует все посты заново; возвращает их число.
+
+    Всё в одной транзакции: поиск не видит пустого индекса, а сбой
+    оставляет прежний.
+    """
+    SearchPosting.objects.all().delete()
+    SearchDocument.objects.all().delete()
+    indexed = last_pk = 0
+    while True:
+        posts = list(Post.objects.filter(pk__gt=last_pk).order_by(
+            'pk').only('pk', 'text')[:batch_size])
+        if not posts:
+            return indexed
+        documents, postings = [], []
+        for post in posts:
+            terms = Counter(tokenize(post.text))
+            documents.append(SearchDocument(
+                post=post, length=sum(terms.values())
+            ))
+            postings.extend(
+                SearchPosting(post=post, term=term, frequency=frequency)
+                for term, frequency in terms.items()
+            )
+        SearchDocument.objects.bulk_create(documents)
+        SearchPosting.objects.bulk_create(postings)
+        indexed += len(posts)
+        last_pk = posts[-1].pk
+
+
+def search_post_ids(query, limit=None):
+    """id постов, подходящих под запрос, от самых релевантных."""
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return []
+    corpus = SearchDocument.objects.aggregate(
+        total=Count('pk'), average=Avg('length')
+    )
+    # Число постов с основой считает база, в память попадает только
+    # верх списка по частоте.
+    document_counts = dict(
+        SearchPosting.objects.filter(term__in=terms).order_by()
+        .values('term').annotate(documents=Count('pk'))
+        .values_list('term', 'documents')
+    )
+    average = corpus['average'] or 1
+    scores = Counter()
+    for term, frequency_in_docs in document_counts.items():
+        idf = math.log(
+            (corpus['total'] - frequency_in_docs + 0.5)
+            / (frequency_in_docs + 0.5) + 1
+        )
+        matches = SearchPosting.objects.filter(term=term).order_by(
+            '-frequency'
+        ).values_list(
+            'post_id', 'frequency', 'post__search_document__length'
+        )[:settings.SEARCH_POSTINGS_PER_TERM]
+        for post_id, frequency, length in matches:
+            norm = BM25_K1 * (
+                1 - BM25_B + BM25_B * (length or 0) / average
+            )
+            scores[post_id] += (
+                idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+            )
+    return [
+        post_id for post_id, _ in
+        scores.most_common(limit or settings.SEARCH_RESULTS_LIMIT)
+    ]
@@ -0,0 +1,107 @@
+from django.db.models import DEFERRED
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from core.db_router import use_primary
+
+from . import follows, search, timelines
+from .caching import bump_feed_versions, bump_post_feeds
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .page_cache import purge_pages
+from .stats import change_counter, change_group_posts
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_init, sender=Post)
+def remember_post_fields(sender, instance, **kwargs):
+    # Через __dict__, чтобы не догружать отложенное поле.
+    instance._initial_group_id = instance.__dict__.get('group_id', DEFERRED)
+    instance._initial_text = instance.__dict__.get('text', DEFERRED)
+
+
+@receiver(pre_save, sender=Post)
+def load_deferred_group(sender, instance, **kwargs):
+    # Пост загружен без group_id: прежнюю группу берём из базы до записи.
+    if instance._initial_group_id is DEFERRED:
+        with use_primary():
+            instance._initial_group_id = Post.objects.filter(
+                pk=instance.pk
+            ).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    old_group_id = instance._initial_group_id
+    if created:
+        change_counter(instance.author_id, 'posts_count', 1)
+        timelines.fan_out_post(instance)
+        if instance.group_id is not None:
+            change_group_posts(instance.group_id, 1)
+    elif old_group_id != instance.group_id:
+        if old_group_id is not None:
+            change_group_posts(old_group_id, -1)
+        if instance.group_id is not None:
+            change_group_posts(instance.group_id, 1)
+    if created or instance.text != instance._initial_text:
+        search.index_post(instance)
+        instance._initial_text = instance.text
+    bump_post_feeds(instance)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    change_counter(instance.author_id, 'posts_count', -1)
+    if instance.group_id is not None:
+        change_group_posts(instance.group_id, -1)
+    bump_post_feeds(instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_group_feeds(sender, instance, **kwargs):
+    bump_feed_versions('groups', f'group:{instance.pk}')
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        change_counter(instance.author_id, 'comments_count', 1)
+    purge_pages(f'post:{instance.post_id}', f'author:{instance.author_id}')
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    change_counter(instance.author_id, 'comments_count', -1)
+    purge_pages(f'post:{instance.post_id}', f'author:{instance.author_id}')
+
+
+@receiver(post_save, sender=Follow)
+def fill_timeline_on_follow(sender, instance, created, **kwargs):
+    if created:
+        change_counter(instance.author_id, 'followers_count', 1)
+        change_counter(instance.user_id, 'following_count', 1)
+        timelines.followers_changed([instance.author_id], 1)
+        timelines.add_author_to_timeline(instance.user_id, instance.author_id)
+        bump_feed_versions(f'follow:{instance.user_id}')
+        purge_pages(f'author:{instance.author_id}',
+                    f'author:{instance.user_id}')
+
+
+@receiver(post_delete, sender=Follow)
+def clean_timeline_on_unfollow(sender, instance, **kwargs):
+    if follows.in_bulk_unfollow():
+        return
+    change_counter(instance.author_id, 'followers_count', -1)
+    change_counter(instance.user_id, 'following_count', -1)
+    timelines.followers_changed([instance.author_id], -1)
+    timelines.remove_author_from_timeline(
+        instance.user_id, instance.author_id
+    )
+    bump_feed_versions(f'follow:{instance.user_id}')
+    purge_pages(f'author:{instance.author_id}', f'author:{instance.user_id}')
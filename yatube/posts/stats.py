@@ -0,0 +1,101 @@
+"""Денормализованные счётчики пользователей (UserStats) и групп.
+
+Сигналы меняют счётчики атомарным UPDATE ... SET x = x + 1. Если строки
+ещё нет, она создаётся с честными COUNT при первом чтении через
+get_stats; расхождения после bulk_create чинит команда reconcile_stats.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.db_router import use_primary
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+    'comments_count': (Comment, 'author'),
+}
+
+
+def change_counter(user_id, field, delta):
+    change_counters([user_id], field, delta)
+
+
+def change_counters(user_ids, field, delta):
+    stats = UserStats.objects.filter(user_id__in=user_ids)
+    if delta < 0:
+        # Разошедшийся счётчик не уводим ниже нуля, его поправит сверка.
+        stats = stats.filter(**{f'{field}__gte': -delta})
+    stats.update(**{field: F(field) + delta})
+
+
+def change_group_posts(group_id, delta):
+    groups = Group.objects.filter(pk=group_id)
+    if delta < 0:
+        groups = groups.filter(posts_count__gte=-delta)
+    groups.update(posts_count=F('posts_count') + delta)
+
+
+def _count_subquery(model, user_field):
+    counts = model.objects.filter(
+        **{user_field: OuterRef('pk')}
+    ).order_by().values(user_field).annotate(total=Count('pk'))
+    return Coalesce(Subquery(counts.values('total')), 0)
+
+
+def actual_counts(users):
+    """Пользователи с посчитанными заново значениями всех счётчиков."""
+    return users.annotate(**{
+        f'actual_{field}': _count_subquery(model, user_field)
+        for field, (model, user_field) in COUNTERS.items()
+    })
+
+
+def reconcile_stats(users=None):
+    """Сверяет счётчики с таблицами; возвращает число исправленных."""
+    if users is None:
+        users = User.objects.all()
+    stored = {
+        stats.user_id: stats
+        for stats in UserStats.objects.filter(user__in=users)
+    }
+    created, changed = [], []
+    for user in actual_counts(users).iterator():
+        values = {
+            field: getattr(user, f'actual_{field}') for field in COUNTERS
+        }
+        stats = stored.get(user.pk)
+        if stats is None:
+            created.append(UserStats(user_id=user.pk, **values))
+        elif any(getattr(stats, f) != v for f, v in values.items()):
+            for field, value in values.items():
+                setattr(stats, field, value)
+            changed.append(stats)
+    UserStats.objects.bulk_create(created, ignore_conflicts=True)
+    UserStats.objects.bulk_update(changed, list(COUNTERS))
+    return len(created) + len(changed)
+
+
+def reconcile_group_counts():
+    """Пересчитывает Group.posts_count; возвращает число исправленных."""
+    changed = []
+    for group in Group.objects.annotate(
+        actual=_count_subquery(Post, 'group')
+    ).exclude(posts_count=F('actual')).iterator():
+        group.posts_count = group.actual
+        changed.append(group)
+    Group.objects.bulk_update(changed, ['posts_count'])
+    return len(changed)
+
+
+def get_stats(user):
+    """Счётчики пользователя; недостающая строка создаётся по COUNT."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        # Реплика может отставать: и COUNT, и новая строка — с основной.
+        with use_primary():
+            reconcile_stats(User.objects.filter(pk=user.pk))
+            return UserStats.objects.get(user=user)
@@ -0,0 +1,47 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Файл называется SHA-256 своего содержимого: posts/ab/abcd….jpg.
+Одинаковые загрузки ложатся в один файл, а так как sorl строит имена
+миниатюр из имени исходника, общими становятся и миниатюры. Один файл
+может принадлежать многим постам, поэтому удаление поста его не
+трогает: ссылки — это строки Post с таким image, а файлы без ссылок,
+не менявшиеся дольше MEDIA_GC_GRACE_SECONDS, убирает collect_media.
+
+Защита от гонки с загрузкой держится на дате изменения файла: _save
+обновляет её у уже существующего файла, а collect_media не трогает
+файлы моложе срока. Поэтому хранилище только локальное (или сетевая
+ФС с честным mtime), а MEDIA_GC_GRACE_SECONDS должен быть больше
+самого долгого запроса от загрузки до сохранения поста. Для S3 и
+подобных хранилищ нужна другая схема — например, строка-ссылка в базе,
+созданная до загрузки.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def _save(self, name, content):
+        directory, filename = os.path.split(name)
+        digest = content_hash(content)
+        extension = os.path.splitext(filename)[1].lower()
+        name = os.path.join(directory, digest[:2], digest + extension)
+        try:
+            # Свежая дата не даёт collect_media удалить файл, пока пост
+            # с ним ещё не сохранён.
+            os.utime(self.path(name))
+            return name
+        except FileNotFoundError:
+            # Файла нет или collect_media удалил его только что.
+            return super()._save(name, content)
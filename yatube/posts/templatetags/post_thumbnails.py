@@ -0,0 +1,31 @@
+from django import template
+
+from posts.thumbnails import picture_aliases, picture_sources
+from posts.thumbnails import ready_thumbnail as get_ready_thumbnail
+from posts.thumbnails import ready_thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def ready_thumbnail(image, alias='feed'):
+    return get_ready_thumbnail(image, alias)
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts):
+    """Миниатюры всех постов страницы одним походом в кеш и базу.
+
+    {% prefetch_thumbnails page_obj as thumbnails %} перед циклом —
+    дальше post_picture берёт готовые адреса из thumbnails.
+    """
+    return ready_thumbnails([post.image for post in posts], picture_aliases())
+
+
+@register.inclusion_tag('posts/includes/picture.html', takes_context=True)
+def post_picture(context, image, sizes='100vw'):
+    """<picture> с srcset по готовым вариантам или заглушка."""
+    return {
+        'picture': picture_sources(image, context.get('thumbnails')),
+        'sizes': sizes,
+    }
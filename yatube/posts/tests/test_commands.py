@@ -0,0 +1,155 @@
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+
+from ..models import Comment, Follow, Group, Post, User
+from ..urls import urlpatterns
+
+
+class ImportPostsCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+
+    def write_file(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w', encoding='utf-8') as file:
+            file.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_import_jsonl(self):
+        """JSONL импортируется пачками с поиском авторов и групп."""
+        records = [
+            {'type': 'post', 'id': 100, 'author': 'author',
+             'group': 'test_slug', 'text': 'Старый пост',
+             'pub_date': '2020-01-02T03:04:05+00:00'},
+            {'type': 'post', 'author': 'nobody', 'text': 'Без автора'},
+            {'type': 'comment', 'post': 100, 'author': 'reader',
+             'text': 'Комментарий'},
+            {'type': 'follow', 'user': 'reader', 'author': 'author'},
+        ]
+        path = self.write_file(
+            '.jsonl', '\n'.join(json.dumps(record) for record in records)
+        )
+        out = StringIO()
+        call_command('import_posts', path, '--batch-size', '2', stdout=out)
+        post = Post.objects.get(pk=100)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.pub_date,
+                         datetime(2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc))
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertTrue(Comment.objects.filter(post=post).exists())
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.author)
+            .exists()
+        )
+        self.assertIn('offset=4 импортировано=3 пропущено=1', out.getvalue())
+
+    def test_dates_are_kept_and_bad_rows_reported(self):
+        """Даты без id сохраняются, битые строки пропускаются с номером."""
+        lines = [
+            json.dumps({'type': 'post', 'author': 'author', 'text': 'Архив',
+                        'pub_date': '2019-05-06T07:08:09+00:00'}),
+            '{не json',
+            json.dumps({'type': 'post', 'author': 'author'}),
+            json.dumps({'type': 'post', 'id': 'x', 'author': 'author',
+                        'text': 'Плохой id'}),
+            json.dumps({'type': 'comment', 'post': 'x', 'author': 'reader',
+                        'text': 'Плохой пост'}),
+        ]
+        path = self.write_file('.jsonl', '\n'.join(lines))
+        err = StringIO()
+        call_command('import_posts', path, stdout=StringIO(), stderr=err)
+        post = Post.objects.get()
+        self.assertEqual(post.text, 'Архив')
+        self.assertEqual(post.pub_date,
+                         datetime(2019, 5, 6, 7, 8, 9, tzinfo=timezone.utc))
+        for number in (2, 3, 4, 5):
+            with self.subTest(line=number):
+                self.assertIn(f'Строка {number} пропущена', err.getvalue())
+
+    def test_new_post_after_import_with_ids(self):
+        """После импорта с id счётчик сброшен и новый пост создаётся."""
+        path = self.write_file('.jsonl', '\n'.join(
+            json.dumps({'type': 'post', 'id': pk, 'author': 'author',
+                        'text': f'Пост {pk}'})
+            for pk in (1, 2, 500)
+        ))
+        reset = connection.ops.sequence_reset_sql
+        with mock.patch.object(connection.ops, 'sequence_reset_sql',
+                               wraps=reset) as sequence_reset_sql:
+            call_command('import_posts', path, stdout=StringIO())
+        self.assertEqual(sequence_reset_sql.call_args[0][1], [Post])
+        post = Post.objects.create(author=self.author, text='Новый')
+        self.assertGreater(post.pk, 500)
+
+    def test_import_csv_with_offset(self):
+        """CSV продолжается с заданного смещения."""
+        path = self.write_file(
+            '.csv',
+            'author,text\nauthor,Первый\nauthor,Второй\nauthor,Третий\n'
+        )
+        call_command('import_posts', path, '--type', 'post',
+                     '--offset', '1', stdout=StringIO())
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', flat=True)),
+            ['Второй', 'Третий']
+        )
+
+
+class BenchCommandTest(TestCase):
+    def test_seed_and_measure_every_url(self):
+        """bench наполняет базу и меряет каждый URL из posts/urls.py."""
+        handle, path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        call_command(
+            'bench', '--seed', '--users', '5', '--posts', '20',
+            '--follows', '10', '--comments', '10', '--requests', '2',
+            '--warmup', '0', '--output', path, stdout=StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), 20)
+        with open(path, encoding='utf-8') as output:
+            report = json.load(output)
+        self.assertEqual(set(report['results']), {
+            f'posts:{pattern.name}' for pattern in urlpatterns
+        })
+        for name, result in report['results'].items():
+            with self.subTest(name=name):
+                self.assertLess(max(result['statuses']), 400)
+                self.assertGreaterEqual(result['p99_ms'], result['p50_ms'])
+        # Страницы гостей меряются без кеша, попадания — отдельно.
+        index = report['results']['posts:index']
+        self.assertGreater(index['queries'], 0)
+        self.assertEqual(index['hot']['queries'], 0)
+        self.assertNotIn('hot', report['results']['posts:search'])
+
+    def test_seed_refuses_non_empty_database(self):
+        """--seed не наполняет базу с постами без --yes-really."""
+        author = User.objects.create_user(username='existing')
+        Post.objects.create(author=author, text='Рабочий пост')
+        options = ['--seed', '--users', '2', '--posts', '3', '--follows',
+                   '2', '--comments', '2', '--requests', '1']
+        with self.assertRaisesMessage(CommandError, '--yes-really'):
+            call_command('bench', *options, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 1)
+        handle, path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        call_command('bench', *options, '--yes-really', '--output', path,
+                     stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 4)
@@ -0,0 +1,144 @@
+import json
+from xml.etree import ElementTree
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Group, Post, User
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+
+
+class SyndicationFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='feed_author', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Группа', slug='feed-group', description='Описание'
+        )
+        for number in range(25):
+            Post.objects.create(
+                text=f'Пост {number} <b>&</b>', author=cls.author,
+                group=cls.group if number % 2 else None,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def fetch(self, name, *args, **headers):
+        response = self.client.get(reverse(name, args=args), **headers)
+        if response.streaming:
+            response.content_bytes = b''.join(response.streaming_content)
+        else:
+            response.content_bytes = response.content
+        return response
+
+    def test_atom_feed(self):
+        """Atom отдаёт последние посты с текстом и автором."""
+        response = self.fetch('posts:feed_index', 'atom')
+        self.assertEqual(
+            response['Content-Type'], 'application/atom+xml; charset=utf-8'
+        )
+        root = ElementTree.fromstring(response.content_bytes)
+        entries = root.findall(f'{ATOM}entry')
+        self.assertEqual(len(entries), 20)
+        self.assertEqual(
+            entries[0].find(f'{ATOM}content').text, 'Пост 24 <b>&</b>'
+        )
+        self.assertEqual(
+            entries[0].find(f'{ATOM}author/{ATOM}name').text, 'Лев Толстой'
+        )
+
+    def test_rss_feed_of_group(self):
+        """RSS группы содержит только её посты со ссылками."""
+        response = self.fetch('posts:feed_group', self.group.slug, 'rss')
+        root = ElementTree.fromstring(response.content_bytes)
+        items = root.findall('channel/item')
+        self.assertEqual(len(items), 12)
+        self.assertEqual(items[0].find('description').text,
+                         'Пост 23 <b>&</b>')
+        self.assertTrue(items[0].find('link').text.endswith(
+            reverse('posts:post_detail', args=[
+                Post.objects.get(text__startswith='Пост 23 ').pk
+            ])
+        ))
+
+    def test_json_feed_of_author(self):
+        """JSON Feed автора в формате версии 1.1."""
+        response = self.fetch(
+            'posts:feed_profile', self.author.username, 'json'
+        )
+        data = json.loads(response.content_bytes)
+        self.assertEqual(data['version'], 'https://jsonfeed.org/version/1.1')
+        self.assertEqual(len(data['items']), 20)
+        self.assertEqual(
+            data['items'][0]['authors'], [{'name': 'Лев Толстой'}]
+        )
+
+    def test_missing_group_and_author(self):
+        """Нет группы или автора — 404."""
+        self.assertEqual(
+            self.fetch('posts:feed_group', 'nope', 'rss').status_code, 404
+        )
+        self.assertEqual(
+            self.fetch('posts:feed_profile', 'nobody', 'json').status_code,
+            404
+        )
+
+    def test_unchanged_feed_returns_304(self):
+        """По ETag или дате неизменная лента отдаёт 304."""
+        response = self.fetch('posts:feed_index', 'rss')
+        for headers in (
+            {'HTTP_IF_NONE_MATCH': response['ETag']},
+            {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']},
+        ):
+            with self.subTest(headers=headers):
+                not_modified = self.fetch('posts:feed_index', 'rss', **headers)
+                self.assertEqual(not_modified.status_code, 304)
+
+    def test_formats_have_own_etags(self):
+        """У каждого формата свой ETag."""
+        etags = {
+            self.fetch('posts:feed_index', fmt)['ETag']
+            for fmt in ('atom', 'rss', 'json')
+        }
+        self.assertEqual(len(etags), 3)
+
+    def test_hosts_and_schemes_get_own_links(self):
+        """Тело из кеша не отдаёт ссылки другого хоста или схемы."""
+        requests = {
+            'http://testserver/': {},
+            'http://localhost/': {'HTTP_HOST': 'localhost'},
+            'https://testserver/': {'secure': True},
+        }
+        etags = set()
+        for origin, headers in requests.items():
+            with self.subTest(origin=origin):
+                response = self.fetch('posts:feed_index', 'json', **headers)
+                data = json.loads(response.content_bytes)
+                self.assertTrue(data['home_page_url'].startswith(origin))
+                etags.add(response['ETag'])
+        self.assertEqual(len(etags), len(requests))
+
+    def test_cached_body_is_served_without_posts_query(self):
+        """Повторно тело берётся из кеша без запроса постов."""
+        first = self.fetch('posts:feed_index', 'atom')
+        with self.assertNumQueries(1):
+            second = self.fetch('posts:feed_index', 'atom')
+        self.assertFalse(second.streaming)
+        self.assertEqual(second.content_bytes, first.content_bytes)
+
+    def test_new_post_changes_feed(self):
+        """Новый пост меняет ETag и попадает в ленту."""
+        etag = self.fetch('posts:feed_index', 'json')['ETag']
+        Post.objects.create(text='Свежий пост', author=self.author)
+        response = self.fetch(
+            'posts:feed_index', 'json', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        data = json.loads(response.content_bytes)
+        self.assertEqual(data['items'][0]['content_text'], 'Свежий пост')
@@ -1,8 +1,15 @@
-from django.test import Client, TestCase
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from . import constants as c
-from ..models import Follow, Post, User
+from ..models import Follow, Post, Recommendation, TimelineEntry, User
+from ..recommendations import build_recommendations, suggestions_for
+from ..timelines import popular_authors, rebuild_timeline
 
 
 class ViewsFollowTests(TestCase):
@@ -21,6 +28,7 @@ class ViewsFollowTests(TestCase):
         cls.FOLLOW_INDEX_PAGE_REVERSE = reverse(c.FOLLOW_INDEX_URL_NAME)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -89,3 +97,146 @@ class ViewsFollowTests(TestCase):
 
         self.assertIn(new_post, new_post_sub)
         self.assertNotIn(new_post, new_post_nonsub)
+
+    def test_new_post_is_written_to_follower_timeline(self):
+        """Новый пост автора попадает в ленту подписчика при публикации."""
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user,
+                                         post=new_post).exists()
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user2).exists()
+        )
+
+    def test_unfollow_clears_timeline(self):
+        """Отписка убирает посты автора из ленты."""
+        Post.objects.create(author=self.author, text='Пост автора')
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(user=self.user).exists())
+        follow.delete()
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user).exists()
+        )
+
+    def test_follow_author_with_many_posts(self):
+        """Подписка на автора с большим архивом пишет всю ленту."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {number}')
+            for number in range(1200)
+        )
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 1200
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_author_is_read_on_request(self):
+        """Посты популярного автора читаются в ленте без fan-out."""
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Для всех')
+        self.assertFalse(TimelineEntry.objects.exists())
+        response = self.authorized_client.get(self.FOLLOW_INDEX_PAGE_REVERSE)
+        self.assertIn(new_post, response.context['page_obj'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_author_below_threshold_is_backfilled(self):
+        """Автор, ставший непопулярным, попадает в ленты подписчиков."""
+        Follow.objects.create(user=self.user, author=self.author)
+        follow = Follow.objects.create(user=self.user2, author=self.author)
+        old_post = Post.objects.create(author=self.author, text='Для всех')
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=old_post).exists()
+        )
+        follow.delete()
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user,
+                                         post=old_post).exists()
+        )
+        response = self.authorized_client.get(self.FOLLOW_INDEX_PAGE_REVERSE)
+        self.assertIn(old_post, response.context['page_obj'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_set_is_cached(self):
+        """Список популярных авторов не пересчитывается на каждом чтении."""
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.user2, author=self.author)
+        self.assertEqual(popular_authors(), {self.author.pk})
+        with self.assertNumQueries(0):
+            popular_authors()
+
+    def test_rebuild_timelines_command(self):
+        """Команда rebuild_timelines восстанавливает ленты."""
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Пост')
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user,
+                                         post=new_post).exists()
+        )
+
+    def test_failed_rebuild_keeps_timeline(self):
+        """Сбой посреди пересборки не оставляет ленту пустой."""
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.create(author=self.author, text='Пост')
+        with mock.patch('posts.timelines._write_entries',
+                        side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                rebuild_timeline(self.user.pk)
+        self.assertTrue(TimelineEntry.objects.filter(user=self.user).exists())
+
+
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.friend, cls.star, cls.other, cls.newbie = [
+            User.objects.create_user(username=name)
+            for name in ('user', 'friend', 'star', 'other', 'newbie')
+        ]
+        Follow.objects.create(user=cls.user, author=cls.friend)
+        Follow.objects.create(user=cls.friend, author=cls.star)
+        Follow.objects.create(user=cls.friend, author=cls.other)
+        Follow.objects.create(user=cls.other, author=cls.star)
+
+    def suggested(self, user):
+        return [item.author for item in suggestions_for(user)]
+
+    def test_friends_of_friends_are_ranked_by_paths(self):
+        """Авторы подписок выше, при равенстве — более популярные."""
+        build_recommendations()
+        self.assertEqual(self.suggested(self.user), [self.star, self.other])
+
+    def test_newcomer_gets_popular_authors(self):
+        """Без подписок советуются популярные авторы, но не он сам."""
+        build_recommendations()
+        self.assertEqual(self.suggested(self.newbie)[0], self.star)
+        self.assertNotIn(self.newbie, self.suggested(self.newbie))
+
+    def test_followed_authors_are_hidden_until_rebuild(self):
+        """Новая подписка скрывается из советов до пересчёта."""
+        build_recommendations()
+        Follow.objects.create(user=self.user, author=self.star)
+        self.assertEqual(self.suggested(self.user), [self.other])
+        self.assertTrue(Recommendation.objects.filter(
+            user=self.user, author=self.star
+        ).exists())
+
+    def test_command_and_profile_widget(self):
+        """Команда пишет советы, профиль показывает их в блоке."""
+        call_command('build_recommendations', '--top', '1',
+                     stdout=StringIO())
+        self.assertEqual(
+            Recommendation.objects.filter(user=self.user).count(), 1
+        )
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(
+            reverse(c.PROFILE_URL_NAME, args=[self.newbie.username])
+        )
+        self.assertEqual(
+            [item.author for item in response.context['suggestions']],
+            [self.star]
+        )
+        self.assertContains(response, 'Кого почитать')
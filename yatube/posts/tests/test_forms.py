@@ -1,16 +1,29 @@
+from hashlib import sha256
 from http import HTTPStatus
+from datetime import timedelta
+from io import BytesIO, StringIO
 import shutil
 import tempfile
 
 from django import forms
 from django.conf import settings
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from sorl.thumbnail.models import KVStore
 
 from . import constants as c
 from ..forms import CommentForm, PostForm
-from ..models import Comment, Group, Post, User
+from ..models import Comment, Group, Post, ThumbnailTask, User
+from ..thumbnails import (can_encode, enqueue_missing_thumbnails,
+                          ready_thumbnail, render_thumbnails,
+                          run_thumbnail_tasks, variant_alias)
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -59,6 +72,12 @@ class PostCreateFormTests(TestCase):
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
+    def stored_name(self, image):
+        """Имя, под которым хранилище кладёт файл: хеш содержимого."""
+        with image.open('rb'):
+            digest = sha256(image.read()).hexdigest()
+        return f'posts/{digest[:2]}/{digest}.gif'
+
     def test_create_post(self):
         """Проверка создания поста"""
         post_count = Post.objects.count()
@@ -77,7 +96,6 @@ class PostCreateFormTests(TestCase):
             self.POST_CREATE_REVERSE,
             data=form_data,
             follow=True)
-        image_name = 'posts/' + str(form_data['image'].name)
         self.assertRedirects(response, self.PROFILE_REVERSE)
         self.assertEqual(Post.objects.count(), post_count + 1,
                          'Поcт не добавлен в БД')
@@ -87,9 +105,142 @@ class PostCreateFormTests(TestCase):
                          'Данные не совпадают')
         self.assertEqual(post.author, form_data['author'],
                          'Данные не совпадают')
-        self.assertEqual(post.image.name, image_name,
+        self.assertEqual(post.image.name, self.stored_name(post.image),
                          'Данные не совпадают')
 
+    def test_thumbnails_are_built_by_worker(self):
+        """Миниатюры строит воркер, до этого шаблон показывает заглушку."""
+        uploaded = SimpleUploadedFile(
+            name='thumb.gif',
+            content=c.SMALL_GIF,
+            content_type='image/gif'
+        )
+        self.authorized_client.post(
+            self.POST_CREATE_REVERSE,
+            data={'text': 'Пост с картинкой', 'image': uploaded}
+        )
+        post = Post.objects.latest('id')
+        self.assertTrue(ThumbnailTask.objects.filter(post=post).exists())
+        detail_url = reverse(c.POST_DETAIL_URL_NAME, args=[post.id])
+        response = self.authorized_client.get(detail_url)
+        self.assertContains(response, 'Картинка готовится')
+        call_command('thumbnail_worker', '--once', stdout=StringIO())
+        self.assertFalse(ThumbnailTask.objects.exists())
+        self.assertIsNotNone(ready_thumbnail(post.image, 'feed'))
+        response = self.authorized_client.get(detail_url)
+        self.assertNotContains(response, 'Картинка готовится')
+        self.assertContains(response, '<img class="card-img my-2"')
+
+    def test_worker_builds_srcset_variants(self):
+        """Варианты всех ширин попадают в srcset, WebP — если есть."""
+        buffer = BytesIO()
+        Image.new('RGB', (1600, 900), 'red').save(buffer, 'PNG')
+        uploaded = SimpleUploadedFile(
+            name='variants.png',
+            content=buffer.getvalue(),
+            content_type='image/png'
+        )
+        self.authorized_client.post(
+            self.POST_CREATE_REVERSE,
+            data={'text': 'Пост с вариантами', 'image': uploaded}
+        )
+        post = Post.objects.latest('id')
+        call_command('thumbnail_worker', '--once', stdout=StringIO())
+        response = self.authorized_client.get(
+            reverse(c.POST_DETAIL_URL_NAME, args=[post.id])
+        )
+        for width in settings.POST_THUMBNAIL_WIDTHS:
+            with self.subTest(width=width):
+                variant = ready_thumbnail(
+                    post.image, variant_alias(width, 'JPEG')
+                )
+                self.assertTrue(variant.name.endswith('.jpg'))
+                self.assertContains(response, f'{variant.url} {width}w')
+        if can_encode('WEBP'):
+            self.assertContains(response, '<source type="image/webp"')
+        else:
+            self.assertIsNone(
+                ready_thumbnail(post.image, variant_alias(480, 'WEBP'))
+            )
+            self.assertNotContains(response, '<source')
+
+    def test_small_source_is_not_upscaled(self):
+        """Исходник уже 480px не растягивается: в srcset его ширина."""
+        buffer = BytesIO()
+        Image.new('RGB', (300, 200), 'red').save(buffer, 'PNG')
+        post = Post.objects.create(
+            author=self.user, text='Маленькая картинка',
+            image=SimpleUploadedFile('small.png', buffer.getvalue()),
+        )
+        render_thumbnails(post)
+        for width in settings.POST_THUMBNAIL_WIDTHS:
+            with self.subTest(width=width):
+                variant = ready_thumbnail(
+                    post.image, variant_alias(width, 'JPEG')
+                )
+                self.assertEqual(variant.width, 300)
+        response = self.authorized_client.get(
+            reverse(c.POST_DETAIL_URL_NAME, args=[post.id])
+        )
+        self.assertContains(response, ' 300w')
+        for width in settings.POST_THUMBNAIL_WIDTHS:
+            self.assertNotContains(response, f' {width}w')
+
+    def test_feed_page_reads_thumbnails_in_one_query(self):
+        """Миниатюры всей страницы ищутся одним запросом в KVStore."""
+        for color in ('red', 'green', 'blue'):
+            buffer = BytesIO()
+            Image.new('RGB', (4, 4), color).save(buffer, 'PNG')
+            post = Post.objects.create(
+                author=self.user, text=f'Пост {color}',
+                image=SimpleUploadedFile(f'{color}.png', buffer.getvalue()),
+            )
+            render_thumbnails(post)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(reverse(c.INDEX_URL_NAME))
+        kvstore_queries = [
+            query for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        self.assertEqual(response.content.decode().count('<picture>'), 3)
+
+    def test_backfill_queues_only_posts_without_thumbnails(self):
+        """--backfill ищет посты без миниатюр по KVStore, а не по задачам."""
+        post = Post.objects.create(
+            author=self.user, text='Пост с картинкой',
+            image=SimpleUploadedFile('pic.gif', c.SMALL_GIF, 'image/gif'),
+        )
+        self.assertEqual(enqueue_missing_thumbnails(), 1)
+        call_command('thumbnail_worker', '--once', stdout=StringIO())
+        self.assertEqual(enqueue_missing_thumbnails(), 0)
+        KVStore.objects.all().delete()
+        cache.clear()
+        self.assertEqual(enqueue_missing_thumbnails(), 1)
+        self.assertEqual(enqueue_missing_thumbnails(), 0)
+        self.assertEqual(
+            list(ThumbnailTask.objects.values_list('post', flat=True)),
+            [post.pk]
+        )
+
+    def test_leased_task_is_not_claimed_twice(self):
+        """Задачу с неистёкшей арендой другой воркер не берёт."""
+        post = Post.objects.create(
+            author=self.user, text='Пост с картинкой',
+            image=SimpleUploadedFile('pic.gif', c.SMALL_GIF, 'image/gif'),
+        )
+        ThumbnailTask.objects.create(
+            post=post, attempts=1,
+            leased_until=timezone.now() + timedelta(minutes=1),
+        )
+        self.assertEqual(run_thumbnail_tasks(10), 0)
+        ThumbnailTask.objects.update(
+            leased_until=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(run_thumbnail_tasks(10), 1)
+        self.assertFalse(ThumbnailTask.objects.exists())
+
     def test_edit_post(self):
         """Валидная форма изменяет запись в Post."""
         posts_count = Post.objects.count()
@@ -109,13 +260,12 @@ class PostCreateFormTests(TestCase):
             data=form_data_new,
             follow=True
         )
-        image_name = 'posts/' + str(form_data_new['image'].name)
         post = Post.objects.get(id=self.post.id)
         self.assertRedirects(response, self.POST_DETAIL_REVERSE)
         self.assertEqual(post.author, form_data_new['author'])
         self.assertEqual(post.text, form_data_new['text'])
         self.assertEqual(post.group.id, form_data_new['group'])
-        self.assertEqual(post.image.name, image_name,
+        self.assertEqual(post.image.name, self.stored_name(post.image),
                          'Данные не совпадают')
         self.assertEqual(Post.objects.count(), posts_count)
         self.assertEqual(response.status_code, HTTPStatus.OK)
@@ -0,0 +1,139 @@
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from core import metrics
+from ..forms import PostForm
+from ..images import prepare_upload
+
+ORIENTATION = 0x0112
+
+
+def upload(name='photo.jpg', size=(4000, 1000), image_format='JPEG',
+           orientation=None):
+    buffer = BytesIO()
+    options = {}
+    if orientation:
+        exif = Image.Exif()
+        exif[ORIENTATION] = orientation
+        options['exif'] = exif.tobytes()
+    Image.new('RGB', size, 'red').save(buffer, image_format, **options)
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+@override_settings(POST_IMAGE_MAX_SIDE=800)
+class PrepareUploadTests(TestCase):
+    def test_photo_is_rotated_downscaled_and_stripped(self):
+        """Фото поворачивается по EXIF, уменьшается и теряет EXIF."""
+        result = prepare_upload(upload(orientation=6))
+        self.assertEqual(result.name, 'photo.jpg')
+        with Image.open(result) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (200, 800))
+            self.assertNotIn(ORIENTATION, image.getexif())
+            self.assertNotIn('exif', image.info)
+
+    def test_small_png_keeps_format_and_size(self):
+        """Маленький PNG остаётся PNG того же размера."""
+        result = prepare_upload(
+            upload('small.png', size=(50, 50), image_format='PNG')
+        )
+        with Image.open(result) as image:
+            self.assertEqual((image.format, image.size), ('PNG', (50, 50)))
+
+    def test_icc_profile_is_kept(self):
+        """ICC-профиль переживает пережатие, EXIF — нет."""
+        # Pillow переносит профиль байтами, разбирать его не нужно.
+        profile = b'display-p3-profile'
+        buffer = BytesIO()
+        Image.new('RGB', (100, 100), 'red').save(
+            buffer, 'JPEG', icc_profile=profile
+        )
+        result = prepare_upload(
+            SimpleUploadedFile('p3.jpg', buffer.getvalue(), 'image/jpeg')
+        )
+        with Image.open(result) as image:
+            self.assertEqual(image.info.get('icc_profile'), profile)
+
+    def test_steps_are_measured(self):
+        """Шаги обработки попадают в гистограммы метрик."""
+        def count():
+            histograms = metrics.snapshot()['histograms']
+            return histograms.get(
+                ('image_step_duration_seconds', 'resize'), {'count': 0}
+            )['count']
+
+        before = count()
+        prepare_upload(upload())
+        self.assertEqual(count(), before + 1)
+
+
+class PostFormImageTests(TestCase):
+    def form(self, image):
+        return PostForm(data={'text': 'Пост'}, files={'image': image})
+
+    def test_unsupported_format_is_rejected(self):
+        """Формат не из списка разрешённых — ошибка формы."""
+        form = self.form(upload('picture.bmp', image_format='BMP'))
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000)
+    def test_too_many_pixels_are_rejected_before_decoding(self):
+        """Разрешение проверяется по заголовку, до декодирования."""
+        form = self.form(upload(size=(100, 100)))
+        self.assertFalse(form.is_valid())
+        self.assertIn('Слишком большое разрешение', form.errors['image'][0])
+
+    @override_settings(POST_IMAGE_MAX_BYTES=100)
+    def test_too_large_file_is_rejected(self):
+        """Файл больше POST_IMAGE_MAX_BYTES не принимается."""
+        self.assertFalse(self.form(upload()).is_valid())
+
+    def test_valid_upload_is_replaced_with_prepared_copy(self):
+        """Форма подменяет загрузку уменьшенной копией."""
+        form = self.form(upload(size=(3000, 3000)))
+        self.assertTrue(form.is_valid(), form.errors)
+        with Image.open(form.cleaned_data['image']) as image:
+            self.assertEqual(image.size, (2560, 2560))
+
+    def test_truncated_file_is_rejected(self):
+        """Обрезанный JPEG даёт ошибку формы, а не исключение."""
+        content = upload(size=(300, 300)).read()
+        truncated = SimpleUploadedFile(
+            'cut.jpg', content[:len(content) // 3], 'image/jpeg'
+        )
+        form = self.form(truncated)
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000)
+    def test_long_animation_is_rejected(self):
+        """Пиксели анимации считаются по всем кадрам."""
+        frames = [Image.new('P', (10, 10), color) for color in range(20)]
+        buffer = BytesIO()
+        frames[0].save(
+            buffer, 'GIF', save_all=True, append_images=frames[1:]
+        )
+        form = self.form(
+            SimpleUploadedFile('long.gif', buffer.getvalue(), 'image/gif')
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn('Слишком много кадров', form.errors['image'][0])
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000)
+    def test_short_animation_is_kept(self):
+        """Анимация в пределах лимита сохраняется целиком."""
+        frames = [Image.new('P', (10, 10), color) for color in range(5)]
+        buffer = BytesIO()
+        frames[0].save(
+            buffer, 'GIF', save_all=True, append_images=frames[1:]
+        )
+        form = self.form(
+            SimpleUploadedFile('short.gif', buffer.getvalue(), 'image/gif')
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        with Image.open(form.cleaned_data['image']) as image:
+            self.assertEqual(image.n_frames, 5)
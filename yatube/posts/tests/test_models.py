@@ -1,6 +1,15 @@
+from unittest import mock, skipUnless
+
+from django.db import connection
 from django.test import TestCase
 
-from ..models import Comment, Follow, Group, Post, User, MAX_SYMBOLS_STR_POST
+from core.db_router import pinned
+from ..models import (Comment, Follow, Group, Post, User, UserStats,
+                      MAX_SYMBOLS_STR_POST)
+from .. import stats
+from ..stats import get_stats, reconcile_group_counts, reconcile_stats
+from ..timelines import timeline_posts
+from ..utils import CursorPaginator
 
 
 class PostModelTest(TestCase):
@@ -84,3 +93,113 @@ class PostModelTest(TestCase):
                 with self.subTest():
                     self.assertEqual(
                         model._meta.get_field(field).help_text, expected_value)
+
+
+class UserStatsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def test_counters_follow_signals(self):
+        """Счётчики меняются при создании и удалении объектов."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        author_stats = UserStats.objects.get(user=self.author)
+        reader_stats = UserStats.objects.get(user=self.reader)
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(reader_stats.following_count, 1)
+        self.assertEqual(reader_stats.comments_count, 1)
+        follow.delete()
+        post.delete()
+        author_stats.refresh_from_db()
+        reader_stats.refresh_from_db()
+        self.assertEqual(author_stats.posts_count, 0)
+        self.assertEqual(author_stats.followers_count, 0)
+        self.assertEqual(reader_stats.following_count, 0)
+        self.assertEqual(reader_stats.comments_count, 0)
+
+    def test_reconcile_fixes_drift(self):
+        """Сверка чинит счётчики после bulk_create."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text='Пост') for _ in range(3)
+        )
+        UserStats.objects.filter(user=self.reader).delete()
+        self.assertEqual(reconcile_stats(), 2)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 3)
+        self.assertTrue(UserStats.objects.filter(user=self.reader).exists())
+
+    def test_missing_row_is_rebuilt_on_primary(self):
+        """Недостающая строка считается и читается с основной базы."""
+        UserStats.objects.filter(user=self.author).delete()
+        Post.objects.create(author=self.author, text='Пост')
+        calls = []
+
+        def reconcile(users):
+            calls.append(pinned())
+            return reconcile_stats(users)
+
+        with mock.patch.object(stats, 'reconcile_stats', reconcile):
+            author_stats = get_stats(User.objects.get(pk=self.author.pk))
+        self.assertEqual(calls, [True])
+        self.assertEqual(author_stats.posts_count, 1)
+
+    def test_reconcile_group_counts(self):
+        """Сверка пересчитывает число постов групп."""
+        group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.bulk_create(
+            Post(author=self.author, group=group, text='Пост')
+            for _ in range(2)
+        )
+        self.assertEqual(reconcile_group_counts(), 1)
+        group.refresh_from_db()
+        self.assertEqual(group.posts_count, 2)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class FeedIndexesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.post = Post.objects.create(author=cls.author, group=cls.group,
+                                       text='Тестовый пост')
+
+    def get_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_feed_pages_use_indexes(self):
+        """Страницы лент читаются по индексу без полной сортировки."""
+        feeds = {
+            'index': (Post.objects.all(), 'pub_date'),
+            'group_list': (self.group.posts.all(), 'pub_date'),
+            'profile': (self.author.posts.all(), 'pub_date'),
+            'follow_index': (timeline_posts(self.user), 'timeline_date'),
+            'comments': (self.post.comments.all(), 'created'),
+        }
+        for name, (queryset, field) in feeds.items():
+            paginator = CursorPaginator(queryset, 10, field)
+            page_queries = (
+                paginator.object_list,
+                paginator.object_list.filter(
+                    **{f'{field}__lt': self.post.pub_date}),
+            )
+            for page_query in page_queries:
+                with self.subTest(feed=name):
+                    plan = self.get_plan(page_query[:11])
+                    self.assertTrue(
+                        any('USING' in step and 'INDEX' in step
+                            for step in plan), plan)
+                    self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan)
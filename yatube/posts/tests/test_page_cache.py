@@ -0,0 +1,95 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='page_author')
+        cls.reader = User.objects.create_user(username='page_reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='page-group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Пост для кеша', author=cls.author, group=cls.group
+        )
+        cls.urls = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_list', args=[cls.group.slug]),
+            'profile': reverse('posts:profile', args=[cls.author.username]),
+            'post': reverse('posts:post_detail', args=[cls.post.pk]),
+        }
+
+    def setUp(self):
+        cache.clear()
+
+    def test_guest_pages_are_cached_with_surrogate_keys(self):
+        """Гость получает страницу из кеша с суррогатными ключами."""
+        keys = {
+            'index': 'index groups',
+            'group': f'group:{self.group.pk} groups',
+            'profile': f'profile:{self.author.pk} author:{self.author.pk} '
+                       'groups',
+            'post': f'post:{self.post.pk} author:{self.author.pk} groups',
+        }
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                first = self.client.get(url)
+                self.assertEqual(first['Surrogate-Key'], keys[name])
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+                self.assertEqual(second.content, first.content)
+                self.assertEqual(second['Surrogate-Key'], keys[name])
+
+    def test_query_string_is_part_of_key(self):
+        """Другая строка запроса — другая запись в кеше."""
+        self.client.get(self.urls['index'])
+        response = self.client.get(self.urls['index'], {'page': 2})
+        self.assertIsNotNone(response.context)
+
+    def test_logged_in_users_are_not_served_from_cache(self):
+        """Авторизованному пользователю страница строится заново."""
+        self.client.get(self.urls['index'])
+        self.client.force_login(self.reader)
+        response = self.client.get(self.urls['index'])
+        self.assertIsNotNone(response.context)
+        self.assertNotIn('Surrogate-Key', response)
+
+    def test_comment_purges_only_affected_pages(self):
+        """Комментарий сбрасывает только страницу своего поста."""
+        for url in self.urls.values():
+            self.client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Новый комментарий'
+        )
+        self.assertContains(self.client.get(self.urls['post']),
+                            'Новый комментарий')
+        for name in ('index', 'group', 'profile'):
+            with self.subTest(page=name), self.assertNumQueries(0):
+                self.client.get(self.urls[name])
+
+    def test_follow_purges_profiles(self):
+        """Подписка сбрасывает профили обоих, но не главную."""
+        reader_url = reverse('posts:profile', args=[self.reader.username])
+        for url in (self.urls['profile'], reader_url, self.urls['index']):
+            self.client.get(url)
+        Follow.objects.create(user=self.reader, author=self.author)
+        for url in (self.urls['profile'], reader_url):
+            with self.subTest(url=url):
+                self.assertIsNotNone(self.client.get(url).context)
+        with self.assertNumQueries(0):
+            self.client.get(self.urls['index'])
+
+    def test_post_edit_purges_its_pages(self):
+        """Правка поста сбрасывает все страницы, где он виден."""
+        for url in self.urls.values():
+            self.client.get(url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный пост'
+        post.save()
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                self.assertContains(self.client.get(url), 'Исправленный пост')
@@ -0,0 +1,83 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Post, SearchPosting, User
+from ..search import search_post_ids, tokenize
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.cats = Post.objects.create(
+            author=cls.user, text='Коты любят спать на тёплых котах')
+        cls.dogs = Post.objects.create(
+            author=cls.user, text='Собака гуляла с котом')
+        cls.english = Post.objects.create(
+            author=cls.user, text='Running dogs and walking cats')
+
+    def test_tokenize_stems_russian_and_english(self):
+        """Формы одного слова приводятся к общей основе."""
+        self.assertEqual(tokenize('Котами'), tokenize('кота'))
+        self.assertEqual(tokenize('тёплых'), tokenize('теплые'))
+        self.assertEqual(tokenize('walking'), tokenize('walks'))
+
+    def test_search_ranks_by_relevance(self):
+        """Пост, где слово встречается чаще, выше в выдаче."""
+        self.assertEqual(search_post_ids('коты'), [self.cats.pk, self.dogs.pk])
+        self.assertEqual(search_post_ids('cat'), [self.english.pk])
+        self.assertEqual(search_post_ids(''), [])
+
+    def test_index_follows_post_changes(self):
+        """Индекс обновляется при правке и удалении поста."""
+        dogs = Post.objects.get(pk=self.dogs.pk)
+        dogs.text = 'Собака гуляла одна'
+        dogs.save()
+        self.assertEqual(search_post_ids('кот'), [self.cats.pk])
+        Post.objects.get(pk=self.cats.pk).delete()
+        self.assertEqual(search_post_ids('кот'), [])
+
+    def test_stop_words_are_not_indexed(self):
+        """Служебные слова не попадают ни в индекс, ни в запрос."""
+        self.assertEqual(tokenize('Собака и кот на крыше'),
+                         tokenize('собака кот крыше'))
+        self.assertEqual(search_post_ids('с на и'), [])
+
+    @override_settings(SEARCH_POSTINGS_PER_TERM=1)
+    def test_postings_per_term_are_capped(self):
+        """Для основы читаются только посты с наибольшей частотой."""
+        self.assertEqual(search_post_ids('коты'), [self.cats.pk])
+
+    def test_unchanged_text_is_not_reindexed(self):
+        """Сохранение без правки текста не трогает индекс."""
+        dogs = Post.objects.get(pk=self.dogs.pk)
+        with CaptureQueriesContext(connection) as queries:
+            dogs.save()
+        self.assertFalse(any(
+            'search' in query['sql'] for query in queries.captured_queries
+        ))
+
+    def test_failed_rebuild_keeps_index(self):
+        """Сбой при перестройке не оставляет пустой индекс."""
+        with mock.patch.object(
+            SearchPosting.objects, 'bulk_create', side_effect=RuntimeError
+        ), self.assertRaises(RuntimeError):
+            call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(search_post_ids('собака'), [self.dogs.pk])
+
+    def test_rebuild_command(self):
+        """Команда перестраивает индекс с нуля."""
+        SearchPosting.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(search_post_ids('собака'), [self.dogs.pk])
+
+    def test_search_view(self):
+        """Страница поиска выводит найденные посты."""
+        response = self.client.get(reverse('posts:search'), {'q': 'собаки'})
+        self.assertEqual(list(response.context['page_obj']), [self.dogs])
@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from . import constants as c
+from ..models import Post, User
+from ..thumbnails import render_thumbnails, thumbnail_name
+
+
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='uploader')
+
+    def setUp(self):
+        # Файлы не откатываются с базой: каждому тесту свой MEDIA_ROOT.
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        cache.clear()
+
+    def create_post(self, name, content=c.SMALL_GIF):
+        return Post.objects.create(
+            author=self.user, text='Мем',
+            image=SimpleUploadedFile(name, content, 'image/gif'),
+        )
+
+    def collect(self, *args):
+        out = StringIO()
+        call_command('collect_media', '--grace=0', *args, stdout=out)
+        return out.getvalue()
+
+    def test_identical_uploads_share_file_and_thumbnails(self):
+        """Одинаковые загрузки делят файл и миниатюры."""
+        first = self.create_post('meme.gif')
+        second = self.create_post('same-meme.GIF')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(
+            first.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.gif$'
+        )
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(os.listdir(directory), [
+            os.path.basename(first.image.name)
+        ])
+        self.assertEqual(
+            thumbnail_name(first.image, 'feed'),
+            thumbnail_name(second.image, 'feed'),
+        )
+
+    def test_different_content_gets_different_name(self):
+        """Разное содержимое — разные имена файлов."""
+        first = self.create_post('meme.gif')
+        second = self.create_post('meme.gif', c.SMALL_GIF[:-1] + b'\x00;')
+        self.assertNotEqual(first.image.name, second.image.name)
+
+    def test_orphans_are_collected_with_thumbnails(self):
+        """collect_media удаляет файлы без ссылок и их миниатюры."""
+        first = self.create_post('meme.gif')
+        second = self.create_post('meme.gif')
+        render_thumbnails(first)
+        thumbnail = thumbnail_name(first.image, 'feed')
+        storage = first.image.storage
+        self.assertTrue(os.path.exists(
+            os.path.join(self.media_root, thumbnail)
+        ))
+        first.delete()
+        self.assertIn('Файлов без ссылок: 0', self.collect())
+        self.assertTrue(storage.exists(second.image.name))
+        second.delete()
+        self.assertIn(second.image.name, self.collect('--dry-run'))
+        self.assertTrue(storage.exists(second.image.name))
+        self.assertIn('Файлов без ссылок: 1', self.collect())
+        self.assertFalse(storage.exists(second.image.name))
+        self.assertFalse(os.path.exists(
+            os.path.join(self.media_root, thumbnail)
+        ))
+
+    def test_grace_period_keeps_fresh_files(self):
+        """Файлы моложе срока не удаляются."""
+        post = self.create_post('meme.gif')
+        post.delete()
+        out = StringIO()
+        call_command('collect_media', stdout=out)
+        self.assertIn('Файлов без ссылок: 0', out.getvalue())
+        self.assertTrue(post.image.storage.exists(post.image.name))
+
+    def test_reupload_refreshes_file_date(self):
+        """Повторная загрузка старого файла продлевает ему срок."""
+        post = self.create_post('meme.gif')
+        post.delete()
+        path = post.image.path
+        os.utime(path, (0, 0))
+        self.create_post('again.gif').delete()
+        out = StringIO()
+        call_command('collect_media', stdout=out)
+        self.assertIn('Файлов без ссылок: 0', out.getvalue())
+        self.assertTrue(os.path.exists(path))
+
+    def test_reupload_after_collection_writes_file_again(self):
+        """Если файл только что удалён, загрузка пишет его заново."""
+        post = self.create_post('meme.gif')
+        os.remove(post.image.path)
+        again = self.create_post('again.gif')
+        self.assertEqual(again.image.name, post.image.name)
+        self.assertTrue(os.path.exists(again.image.path))
@@ -1,10 +1,12 @@
-from django.core.cache import cache
+from django.core.cache import cache, caches
 from django.test import Client, TestCase
 from django.urls import reverse
 
 from . import constants as c
-from ..models import Group, Post, User
-from yatube.settings import PAGINATOR_AMOUNT
+from .. import group_windows
+from ..models import Comment, Follow, Group, Post, User
+from ..utils import CURSOR_NEXT, encode_cursor
+from yatube.settings import COMMENTS_PER_PAGE, PAGINATOR_AMOUNT
 
 
 class PostViewTests(TestCase):
@@ -48,7 +50,7 @@ class PostViewTests(TestCase):
         posts: list = [post_paginator for x in range(1, self.TOTAL_POSTS)]
         Post.objects.bulk_create(posts)
         pages = (
-            (1, self.PAGINATOR_AMOUNT),
+            (1, PAGINATOR_AMOUNT),
             (2, self.SECOND_PAGE)
         )
         paginated_urls: tuple = (
@@ -62,6 +64,47 @@ class PostViewTests(TestCase):
                     response = self.authorized_client.get(url, {'page': page})
             self.assertEqual(len(response.context['page_obj']), count)
 
+    def test_cursor_pagination_walks_feed(self):
+        """Курсорная пагинация проходит ленту без пропусков и повторов."""
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', group=self.group, author=self.user)
+            for i in range(1, self.TOTAL_POSTS)
+        )
+        first_page = self.authorized_client.get(
+            self.GROUP_LIST_REVERSE).context['page_obj']
+        self.assertEqual(len(first_page), PAGINATOR_AMOUNT)
+        self.assertFalse(first_page.has_previous())
+        second_page = self.authorized_client.get(
+            self.GROUP_LIST_REVERSE,
+            {'cursor': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(second_page), self.SECOND_PAGE)
+        self.assertFalse(second_page.has_next())
+        seen = [post.pk for post in first_page] + [
+            post.pk for post in second_page]
+        self.assertEqual(len(set(seen)), self.TOTAL_POSTS)
+        back_page = self.authorized_client.get(
+            self.GROUP_LIST_REVERSE,
+            {'cursor': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back_page), list(first_page))
+        self.assertFalse(back_page.has_previous())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор отдаёт первую страницу."""
+        response = self.authorized_client.get(
+            self.INDEX_REVERSE, {'cursor': 'broken'})
+        self.assertEqual(response.context['page_obj'][0], self.post)
+
+    def test_cursor_with_huge_id_returns_first_page(self):
+        """Курсор с id вне BIGINT отдаёт первую страницу, а не 500."""
+        for pk in (2 ** 63, 10 ** 22, -1):
+            cursor = encode_cursor(CURSOR_NEXT, self.post.pub_date, pk)
+            with self.subTest(pk=pk):
+                response = self.authorized_client.get(
+                    self.INDEX_REVERSE, {'cursor': cursor})
+                self.assertEqual(response.context['page_obj'][0], self.post)
+
     def test_post_detail_pages_show_correct_context(self):
         """Шаблон post_detail сформирован с правильным контекстом."""
         response = self.authorized_client.get(self.POST_DETAIL_REVERSE)
@@ -71,6 +114,24 @@ class PostViewTests(TestCase):
         self.assertEqual(post_context.group, self.post.group)
         self.assertEqual(post_context.image, self.post.image)
 
+    def test_post_detail_paginates_comments(self):
+        """Комментарии к посту выводятся страницами по курсору."""
+        extra = 5
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text=f'Коммент {i}')
+            for i in range(COMMENTS_PER_PAGE + extra)
+        )
+        first = self.authorized_client.get(
+            self.POST_DETAIL_REVERSE).context['comments']
+        self.assertEqual(len(first), COMMENTS_PER_PAGE)
+        with self.assertNumQueries(0):
+            [comment.author.username for comment in first]
+        second = self.authorized_client.get(
+            self.POST_DETAIL_REVERSE, {'comments': first.next_cursor}
+        ).context['comments']
+        self.assertEqual(len(second), extra)
+        self.assertFalse(second.has_next())
+
     def test_unauth_pages_show_correct_context(self):
         """Шаблоны index, group_list, profile """
         """сформированы с правильным контекстом."""
@@ -92,7 +153,8 @@ class PostViewTests(TestCase):
         """Кеш работает правильно"""
         response = self.authorized_client.get(self.INDEX_REVERSE)
         before = response.content.decode("utf-8")
-        Post.objects.get(id=self.post.id).delete()
+        # update() не шлёт сигналов, поэтому версия ленты не меняется.
+        Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
         response = self.authorized_client.get(self.INDEX_REVERSE)
         after = response.content.decode("utf-8")
         self.assertEqual(before, after)
@@ -100,3 +162,189 @@ class PostViewTests(TestCase):
         response = self.authorized_client.get(self.INDEX_REVERSE)
         after = response.content.decode("utf-8")
         self.assertNotEqual(before, after)
+
+    def test_cache_invalidated_on_post_changes(self):
+        """Изменение поста сбрасывает кеш всех его лент."""
+        feeds = (self.INDEX_REVERSE, self.GROUP_LIST_REVERSE,
+                 self.PROFILE_REVERSE)
+        for url in feeds:
+            self.authorized_client.get(url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Отредактированный пост'
+        post.save()
+        for url in feeds:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, 'Отредактированный пост')
+        post.delete()
+        for url in feeds:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertNotContains(response, 'Отредактированный пост')
+
+    def test_cache_separates_pages(self):
+        """Разные страницы ленты кешируются отдельно."""
+        Post.objects.bulk_create(
+            Post(text=f'Пост номер {i}', author=self.user)
+            for i in range(self.TOTAL_POSTS)
+        )
+        first = self.authorized_client.get(self.INDEX_REVERSE)
+        second = self.authorized_client.get(
+            self.INDEX_REVERSE,
+            {'cursor': first.context['page_obj'].next_cursor}
+        )
+        self.assertNotEqual(first.content, second.content)
+
+
+class FeedQueryCountTests(TestCase):
+    # Сессия и пользователь + запросы самой страницы. Группе после
+    # cache.clear() нужен ещё запрос id для окна новых постов, профилю —
+    # запрос рекомендаций «кого почитать».
+    FEED_QUERIES = {
+        c.INDEX_URL_NAME: 3,
+        c.GROUP_LIST_URL_NAME: 5,
+        c.PROFILE_URL_NAME: 7,
+        c.FOLLOW_INDEX_URL_NAME: 4,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.urls = {
+            c.INDEX_URL_NAME: reverse(c.INDEX_URL_NAME),
+            c.GROUP_LIST_URL_NAME: reverse(c.GROUP_LIST_URL_NAME,
+                                           args=[cls.group.slug]),
+            c.PROFILE_URL_NAME: reverse(c.PROFILE_URL_NAME,
+                                        args=[cls.author.username]),
+            c.FOLLOW_INDEX_URL_NAME: reverse(c.FOLLOW_INDEX_URL_NAME),
+        }
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_feed_query_count_is_constant(self):
+        """Число запросов ленты не зависит от длины страницы."""
+        for posts_count in (1, PAGINATOR_AMOUNT):
+            for _ in range(posts_count):
+                Post.objects.create(author=self.author, group=self.group,
+                                    text='Тестовый пост')
+            for name, queries in self.FEED_QUERIES.items():
+                with self.subTest(url=name, posts=posts_count):
+                    cache.clear()
+                    with self.assertNumQueries(queries):
+                        self.client.get(self.urls[name])
+
+
+class GroupWindowTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other_slug',
+            description='Тестовое описание',
+        )
+        cls.url = reverse(c.GROUP_LIST_URL_NAME, args=[cls.group.slug])
+
+    def setUp(self):
+        cache.clear()
+        # Гостям страница приходит из кеша страниц, окно читают остальные.
+        self.client.force_login(self.author)
+        self.posts = [
+            Post.objects.create(author=self.author, group=self.group,
+                                text=f'Пост {number}')
+            for number in range(PAGINATOR_AMOUNT + 2)
+        ]
+
+    def page_posts(self):
+        return list(self.client.get(self.url).context['page_obj'])
+
+    def test_first_page_is_read_by_ids_from_window(self):
+        """Тёплая первая страница — один запрос постов по id."""
+        self.page_posts()
+        # Сессия, пользователь, группа и посты по id.
+        with self.assertNumQueries(4) as queries:
+            page = self.page_posts()
+        self.assertIn(' IN (', queries.captured_queries[-1]['sql'])
+        self.assertEqual(page, self.posts[::-1][:PAGINATOR_AMOUNT])
+
+    def test_window_follows_new_deleted_and_moved_posts(self):
+        """Окно видит новые, удалённые и перенесённые посты."""
+        self.page_posts()
+        new_post = Post.objects.create(author=self.author, group=self.group,
+                                       text='Новый пост')
+        self.assertEqual(self.page_posts()[0], new_post)
+        new_post.delete()
+        moved = self.posts[-1]
+        moved.group = self.other_group
+        moved.save()
+        page = self.page_posts()
+        self.assertNotIn(new_post, page)
+        self.assertNotIn(moved, page)
+        self.assertEqual(len(page), PAGINATOR_AMOUNT)
+        other_url = reverse(c.GROUP_LIST_URL_NAME,
+                            args=[self.other_group.slug])
+        self.assertIn(
+            moved, self.client.get(other_url).context['page_obj']
+        )
+
+    def test_group_posts_count_is_stored(self):
+        """Число постов группы хранится и меняется сигналами."""
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, len(self.posts))
+        self.posts[0].delete()
+        moved = self.posts[1]
+        moved.group = self.other_group
+        moved.save()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, len(self.posts) - 2)
+        self.assertEqual(self.other_group.posts_count, 1)
+        response = self.client.get(self.url)
+        self.assertContains(response, f'Записей: {len(self.posts) - 2}')
+
+    def test_stale_window_falls_back_to_database(self):
+        """Окно, разошедшееся с базой, не теряет посты на странице."""
+        self.page_posts()
+        Post.objects.filter(pk=self.posts[-1].pk).update(
+            group=self.other_group
+        )
+        page = self.page_posts()
+        self.assertEqual(len(page), PAGINATOR_AMOUNT)
+        self.assertNotIn(self.posts[-1], page)
+
+    def test_concurrent_prepends_are_not_lost(self):
+        """Окно, прочитанное до записи, не затирает новый пост."""
+        self.page_posts()
+        stale_key = group_windows.window_key(self.group.pk)
+        stale = caches['posts'].get(stale_key)
+        first = Post.objects.create(author=self.author, group=self.group,
+                                    text='Первый')
+        second = Post.objects.create(author=self.author, group=self.group,
+                                     text='Второй')
+        # Воркер, начавший до записей, дописывает устаревшее окно.
+        caches['posts'].set(stale_key, stale)
+        self.assertEqual(self.page_posts()[:2], [second, first])
+
+    def test_move_of_deferred_post_updates_counts(self):
+        """Перенос поста, загруженного без group_id, считается верно."""
+        post = Post.objects.only('text').get(pk=self.posts[0].pk)
+        post.group = self.other_group
+        post.save()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, len(self.posts) - 1)
+        self.assertEqual(self.other_group.posts_count, 1)
+        self.assertNotIn(post, self.page_posts())
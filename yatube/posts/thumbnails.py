@@ -0,0 +1,280 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+При сохранении картинки ставится ThumbnailTask, воркер thumbnail_worker
+строит все миниатюры из POST_THUMBNAILS через sorl-thumbnail. Шаблоны
+только ищут готовую миниатюру и до её появления показывают заглушку,
+так что разбор и сжатие картинки не происходят внутри запроса.
+
+Для srcset к алиасу 'feed' строятся варианты шириной из
+POST_THUMBNAIL_WIDTHS в каждом формате из POST_THUMBNAIL_FORMATS.
+Имя файла sorl — хеш исходника, геометрии и опций, поэтому новый
+вариант всегда получает новый адрес и может кешироваться навсегда.
+"""
+import logging
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, Q
+from django.utils import timezone
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore
+
+from .caching import bump_post_feeds
+from .models import Post, ThumbnailTask
+
+logger = logging.getLogger(__name__)
+
+# Сколько постов проверять за раз: ключи всех алиасов идут одним IN.
+BACKFILL_CHUNK_SIZE = 100
+
+MIME_TYPES = {
+    'AVIF': 'image/avif', 'WEBP': 'image/webp', 'JPEG': 'image/jpeg',
+}
+
+
+def variant_alias(width, image_format):
+    return f'feed_{width}_{image_format.lower()}'
+
+
+def thumbnail_specs():
+    """Алиас -> (геометрия, опции): POST_THUMBNAILS и варианты 'feed'."""
+    geometry, options = settings.POST_THUMBNAILS['feed']
+    width, height = map(int, geometry.split('x'))
+    return {
+        **settings.POST_THUMBNAILS,
+        **{
+            # Без увеличения: растянутый до 1440px маленький исходник
+            # телефон с плотным экраном выбрал бы зря.
+            variant_alias(variant_width, image_format): (
+                f'{variant_width}x{round(height * variant_width / width)}',
+                {**options, 'upscale': False, 'format': image_format},
+            )
+            for variant_width in settings.POST_THUMBNAIL_WIDTHS
+            for image_format in settings.POST_THUMBNAIL_FORMATS
+        },
+    }
+
+
+def can_encode(image_format):
+    """Pillow без libwebp или libavif не умеет писать эти форматы."""
+    Image.init()
+    return image_format in Image.SAVE
+
+
+def buildable_specs():
+    """thumbnail_specs без форматов, которые Pillow не умеет писать."""
+    return {
+        alias: (geometry, options)
+        for alias, (geometry, options) in thumbnail_specs().items()
+        if can_encode(options.get('format', 'JPEG'))
+    }
+
+
+def enqueue_thumbnails(post):
+    if post.image:
+        ThumbnailTask.objects.create(post=post)
+
+
+def render_thumbnails(post):
+    """Строит все миниатюры поста; уже готовые sorl берёт из хранилища."""
+    for geometry, options in buildable_specs().values():
+        get_thumbnail(post.image, geometry, **options)
+
+
+def run_thumbnail_tasks(limit):
+    """Выполняет до limit задач; возвращает число обработанных.
+
+    Задача забирается на THUMBNAIL_TASK_LEASE_SECONDS: пока аренда не
+    истекла, другие воркеры её не трогают. Упавший воркер аренду не
+    снимет, и задачу после её истечения подхватит другой.
+    """
+    now = timezone.now()
+    free = Q(leased_until__isnull=True) | Q(leased_until__lt=now)
+    tasks = ThumbnailTask.objects.filter(
+        free, attempts__lt=settings.THUMBNAIL_TASK_ATTEMPTS
+    ).select_related('post')[:limit]
+    lease = now + timedelta(seconds=settings.THUMBNAIL_TASK_LEASE_SECONDS)
+    processed = 0
+    for task in tasks:
+        # Задачу забирает тот воркер, который первым увеличил attempts.
+        claimed = ThumbnailTask.objects.filter(
+            free, pk=task.pk, attempts=task.attempts
+        ).update(attempts=F('attempts') + 1, leased_until=lease)
+        if not claimed:
+            continue
+        processed += 1
+        try:
+            if task.post.image:
+                render_thumbnails(task.post)
+        except Exception as error:
+            logger.exception('Не удалось построить миниатюры %s', task)
+            ThumbnailTask.objects.filter(pk=task.pk).update(
+                error=str(error), leased_until=None
+            )
+        else:
+            task.delete()
+            # Страницы с заглушкой вместо картинки уже лежат в кеше.
+            bump_post_feeds(task.post)
+    return processed
+
+
+def _missing_thumbnail_posts(posts, aliases):
+    ready = ready_thumbnails([post.image for post in posts], aliases)
+    missing = [
+        post.pk for post in posts
+        if any((post.image.name, alias) not in ready for alias in aliases)
+    ]
+    queued = set(ThumbnailTask.objects.filter(
+        post_id__in=missing
+    ).values_list('post_id', flat=True))
+    return [post_id for post_id in missing if post_id not in queued]
+
+
+def enqueue_missing_thumbnails():
+    """Ставит задачи постам, у которых нет хотя бы одной миниатюры.
+
+    Готовность проверяется по KVStore через ready_thumbnails: выполненные
+    задачи удаляются, и по одной таблице задач её не узнать.
+    Возвращает число новых задач.
+    """
+    aliases = list(buildable_specs())
+    posts = Post.objects.exclude(image='').only('image').order_by('pk')
+    queued = 0
+    post_iterator = posts.iterator()
+    batch = list(islice(post_iterator, BACKFILL_CHUNK_SIZE))
+    while batch:
+        post_ids = _missing_thumbnail_posts(batch, aliases)
+        ThumbnailTask.objects.bulk_create(
+            ThumbnailTask(post_id=post_id) for post_id in post_ids
+        )
+        queued += len(post_ids)
+        batch = list(islice(post_iterator, BACKFILL_CHUNK_SIZE))
+    return queued
+
+
+def thumbnail_name(image, alias):
+    """Имя файла миниатюры, которое sorl построит для алиаса.
+
+    Повторяет подготовку опций из ThumbnailBackend.get_thumbnail,
+    чтобы найти миниатюру, не запуская её генерацию.
+    """
+    geometry, options = thumbnail_specs()[alias]
+    options = dict(options)
+    source = ImageFile(image)
+    backend = default.backend
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return backend._get_thumbnail_filename(source, geometry, options)
+
+
+def thumbnail_key(image, alias):
+    """Ключ записи о миниатюре в KVStore и кеше sorl."""
+    thumbnail = ImageFile(thumbnail_name(image, alias), default.storage)
+    return add_prefix(thumbnail.key)
+
+
+def ready_thumbnails(images, aliases):
+    """Готовые миниатюры {(имя картинки, алиас): ImageFile}.
+
+    Ищет записи в кеше и таблице sorl так же, как cached_db_kvstore,
+    но для всех картинок сразу: один get_many и не больше одного
+    запроса в KVStore. Промахи не запоминаются: иначе миниатюра от
+    воркера была бы не видна этому процессу до истечения кеша.
+    """
+    # Разные алиасы с одинаковыми опциями дают один и тот же файл.
+    keys = {}
+    for image in images:
+        if image:
+            for alias in aliases:
+                keys.setdefault(thumbnail_key(image, alias), []).append(
+                    (image.name, alias)
+                )
+    if not keys:
+        return {}
+    cache = caches[sorl_settings.THUMBNAIL_CACHE]
+    values = {
+        key: value for key, value in cache.get_many(list(keys)).items()
+        if value != EMPTY_VALUE
+    }
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(KVStore.objects.filter(key__in=missing).values_list(
+            'key', 'value'
+        ))
+        cache.set_many(found, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(found)
+    thumbnails = {}
+    for key, value in values.items():
+        thumbnail = deserialize_image_file(value)
+        for pair in keys[key]:
+            thumbnails[pair] = thumbnail
+    return thumbnails
+
+
+def ready_thumbnail(image, alias):
+    """Готовая миниатюра или None."""
+    if not image:
+        return None
+    return ready_thumbnails([image], [alias]).get((image.name, alias))
+
+
+def picture_aliases():
+    return ['feed', *(
+        variant_alias(width, image_format)
+        for image_format in settings.POST_THUMBNAIL_FORMATS
+        for width in settings.POST_THUMBNAIL_WIDTHS
+    )]
+
+
+def picture_sources(image, thumbnails=None):
+    """Готовые варианты картинки для <picture> или None.
+
+    src — миниатюра 'feed' для старых браузеров, srcset — варианты
+    последнего формата из POST_THUMBNAIL_FORMATS, sources — остальные
+    форматы, для которых воркер уже что-то построил. Ширина в srcset —
+    настоящая ширина файла: варианты шире исходника не увеличиваются,
+    повторяют его ширину и в список не попадают. thumbnails — результат
+    ready_thumbnails для всей страницы, если он уже есть.
+    """
+    if thumbnails is None:
+        thumbnails = ready_thumbnails([image], picture_aliases())
+    src = thumbnails.get((image.name, 'feed'))
+    if src is None:
+        return None
+    srcsets = {}
+    for image_format in settings.POST_THUMBNAIL_FORMATS:
+        candidates = {}
+        for width in settings.POST_THUMBNAIL_WIDTHS:
+            thumbnail = thumbnails.get(
+                (image.name, variant_alias(width, image_format))
+            )
+            if thumbnail is not None:
+                candidates.setdefault(thumbnail.width, thumbnail.url)
+        candidates = [
+            f'{url} {width}w' for width, url in candidates.items()
+        ]
+        if candidates:
+            srcsets[image_format] = ', '.join(candidates)
+    *formats, fallback = settings.POST_THUMBNAIL_FORMATS
+    return {
+        'src': src.url,
+        'srcset': srcsets.get(fallback, ''),
+        'sources': [
+            {'type': MIME_TYPES[image_format], 'srcset': srcsets[image_format]}
+            for image_format in formats if image_format in srcsets
+        ],
+    }
@@ -0,0 +1,165 @@
+"""Ленты подписок с раскладкой постов при публикации (fan-out on write).
+
+Каждый новый пост сразу записывается в TimelineEntry всем подписчикам
+автора, и лента читается одним диапазоном по индексу (user, -pub_date).
+Авторы, у которых подписчиков больше TIMELINE_FANOUT_LIMIT, в ленты
+не раскладываются: их посты подмешиваются при чтении (fan-out on read).
+Множество таких авторов кешируется; когда автор переходит порог,
+кеш сбрасывается, а опустившемуся ниже порога прежние посты
+раскладываются по лентам подписчиков.
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F, Q
+
+from .caching import CACHE_ALIAS
+from .models import Follow, Post, TimelineEntry, UserStats
+from .utils import bulk_create_in_chunks
+
+POPULAR_KEY = 'timeline_popular:{}'
+
+
+def popular_authors():
+    """Все авторы, чьи посты читаются при открытии ленты."""
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    cache = caches[CACHE_ALIAS]
+    key = POPULAR_KEY.format(limit)
+    popular = cache.get(key)
+    if popular is None:
+        popular = set(UserStats.objects.filter(
+            followers_count__gt=limit
+        ).values_list('user_id', flat=True))
+        cache.set(key, popular, settings.FEED_CACHE_TIMEOUT)
+    return popular
+
+
+def popular_author_ids(author_ids):
+    """Авторы из списка, чьи посты читаются при открытии ленты."""
+    popular = popular_authors()
+    return popular & set(author_ids) if popular else set()
+
+
+def _write_entries(user_ids, posts):
+    bulk_create_in_chunks(
+        TimelineEntry.objects,
+        (
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for user_id in user_ids
+            for post_id, pub_date in posts
+        ),
+        settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out_post(post):
+    """Кладёт новый пост в ленты всех подписчиков автора."""
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    follower_ids = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)[:limit + 1]
+    )
+    if len(follower_ids) > limit:
+        return
+    _write_entries(follower_ids, [(post.pk, post.pub_date)])
+
+
+def followers_changed(author_ids, delta):
+    """Проверяет, не перешли ли авторы порог после изменения на delta.
+
+    Счётчик подписчиков меняется на единицу, поэтому порог перешли те,
+    у кого теперь ровно граничное значение.
+    """
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    crossed = list(UserStats.objects.filter(
+        user__in=author_ids,
+        followers_count=limit + 1 if delta > 0 else limit,
+    ).values_list('user_id', flat=True))
+    if not crossed:
+        return
+    caches[CACHE_ALIAS].delete(POPULAR_KEY.format(limit))
+    if delta < 0:
+        for author_id in crossed:
+            _backfill_followers(author_id)
+
+
+def _backfill_followers(author_id):
+    # Посты популярного автора при публикации в ленты не попадали.
+    follower_ids = list(Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True))
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date'
+    ).iterator()
+    while True:
+        chunk = list(islice(posts, settings.TIMELINE_BATCH_SIZE))
+        if not chunk:
+            return
+        _write_entries(follower_ids, chunk)
+
+
+def add_authors_to_timeline(user_id, author_ids):
+    """Дописывает в ленту посты авторов, на которых подписались."""
+    author_ids = set(author_ids) - popular_author_ids(author_ids)
+    if not author_ids:
+        return
+    posts = Post.objects.filter(author__in=author_ids).values_list(
+        'pk', 'pub_date'
+    )
+    _write_entries([user_id], posts.iterator())
+
+
+def add_author_to_timeline(user_id, author_id):
+    add_authors_to_timeline(user_id, [author_id])
+
+
+def remove_authors_from_timeline(user_id, author_ids):
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author__in=author_ids
+    ).delete()
+
+
+def remove_author_from_timeline(user_id, author_id):
+    remove_authors_from_timeline(user_id, [author_id])
+
+
+@transaction.atomic
+def rebuild_timeline(user_id):
+    """Пересобирает ленту пользователя с нуля по таблице Follow.
+
+    Удаление и запись — одна транзакция: пока лента пересобирается,
+    читатель видит прежнюю, а после сбоя она остаётся целой.
+    """
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    author_ids = Follow.objects.filter(user_id=user_id).values_list(
+        'author_id', flat=True
+    )
+    skipped = popular_author_ids(author_ids)
+    posts = Post.objects.filter(author__in=author_ids).exclude(
+        author__in=skipped
+    ).values_list('pk', 'pub_date')
+    _write_entries([user_id], posts.iterator())
+
+
+def timeline_posts(user):
+    """Посты ленты подписок: записи ленты плюс популярные авторы.
+
+    Ключ пагинации — аннотация timeline_date: без популярных авторов это
+    дата из самой ленты, и страница читается по её индексу без сортировки.
+    """
+    inbox = TimelineEntry.objects.filter(user=user)
+    popular = popular_authors()
+    if popular:
+        popular = set(Follow.objects.filter(
+            user=user, author__in=popular
+        ).values_list('author_id', flat=True))
+    if not popular:
+        return Post.objects.filter(timeline_entries__user=user).annotate(
+            timeline_date=F('timeline_entries__pub_date')
+        )
+    return Post.objects.filter(
+        Q(pk__in=inbox.values('post_id')) | Q(author__in=popular)
+    ).annotate(timeline_date=F('pub_date'))
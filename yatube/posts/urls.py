@@ -1,6 +1,6 @@
-from django.urls import path
+from django.urls import path, re_path
 
-from . import views
+from . import feeds, views
 
 app_name = 'posts'
 
@@ -8,6 +8,7 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path('search/', views.search, name='search'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
@@ -23,5 +24,11 @@ urlpatterns = [
         'profile/<str:username>/unfollow/',
         views.profile_unfollow,
         name='profile_unfollow'
-    )
+    ),
+    re_path(r'^feeds/index\.(?P<fmt>atom|rss|json)$', feeds.index_feed,
+            name='feed_index'),
+    re_path(r'^feeds/group/(?P<slug>[-\w]+)\.(?P<fmt>atom|rss|json)$',
+            feeds.group_feed, name='feed_group'),
+    re_path(r'^feeds/profile/(?P<username>[^/]+)\.(?P<fmt>atom|rss|json)$',
+            feeds.profile_feed, name='feed_profile'),
 ]
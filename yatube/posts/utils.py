@@ -1,10 +1,123 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from itertools import islice
+
 from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 from yatube.settings import PAGINATOR_AMOUNT
 
+CURSOR_NEXT = 'n'
+CURSOR_PREVIOUS = 'p'
+# id в курсоре должен помещаться в BIGINT, иначе запрос падает.
+MAX_CURSOR_PK = 2 ** 63 - 1
+
+
+def encode_cursor(direction, value, pk):
+    """Упаковывает позицию (дата, id) в непрозрачный токен."""
+    raw = f'{direction}|{value.isoformat()}|{pk}'.encode()
+    return urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Распаковывает токен; для битого токена возвращает None."""
+    try:
+        raw = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        direction, value, pk = raw.split('|')
+        value = parse_datetime(value)
+        pk = int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+    if (direction not in (CURSOR_NEXT, CURSOR_PREVIOUS) or value is None
+            or not 0 <= pk <= MAX_CURSOR_PK):
+        return None
+    return direction, value, pk
+
+
+def bulk_create_in_chunks(manager, objs, chunk_size, **kwargs):
+    """bulk_create частями по chunk_size объектов из итератора.
+
+    Генератор не собирается целиком в память, а размер одного INSERT
+    выбирает бэкенд: SQLite не принимает больше 500 строк за раз.
+    """
+    objs = iter(objs)
+    while True:
+        chunk = list(islice(objs, chunk_size))
+        if not chunk:
+            return
+        manager.bulk_create(chunk, **kwargs)
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (field, id) от новых записей к старым.
+
+    Каждая страница читается одним запросом
+    `WHERE (field, id) < курсор LIMIT n + 1`,
+    поэтому дальние страницы стоят столько же, сколько первая.
+    """
+
+    def __init__(self, object_list, per_page, field='pub_date'):
+        self.field = field
+        super().__init__(object_list.order_by(f'-{field}', '-pk'), per_page)
+
+    def page(self, cursor=None):
+        """Возвращает страницу после (или до) позиции из курсора.
+
+        Общее число страниц неизвестно, поэтому `number` и `num_pages`
+        относительные: этого достаточно для has_next/has_previous.
+        Токены соседних страниц лежат в `next_cursor`/`previous_cursor`.
+        """
+        position = decode_cursor(cursor) if cursor else None
+        queryset = self.object_list
+        direction = None
+        if position is not None:
+            direction, value, pk = position
+            lookup = 'lt' if direction == CURSOR_NEXT else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{lookup}': value})
+                | Q(**{self.field: value, f'pk__{lookup}': pk})
+            )
+            if direction == CURSOR_PREVIOUS:
+                queryset = queryset.reverse()
+        return self._make_page(list(queryset[:self.per_page + 1]), direction)
+
+    def first_page(self, items):
+        """Первая страница из уже выбранных per_page + 1 объектов."""
+        return self._make_page(list(items), None)
+
+    def _make_page(self, items, direction):
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if not items and direction is not None:
+            # За курсором ничего не осталось: отдаём первую страницу.
+            return self.page()
+        if direction == CURSOR_PREVIOUS:
+            items.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, direction == CURSOR_NEXT
+        number = 2 if has_previous else 1
+        self.num_pages = number + 1 if has_next else number
+        page = self._get_page(items, number, self)
+        page.uses_cursor = True
+        page.next_cursor = (
+            self._cursor(CURSOR_NEXT, items[-1]) if has_next else None
+        )
+        page.previous_cursor = (
+            self._cursor(CURSOR_PREVIOUS, items[0]) if has_previous else None
+        )
+        return page
+
+    def _cursor(self, direction, obj):
+        return encode_cursor(direction, getattr(obj, self.field), obj.pk)
+
 
 def paginate_page(posts, request,
-                  paginator_number=PAGINATOR_AMOUNT):
-    paginator = Paginator(posts, paginator_number)
+                  paginator_number=PAGINATOR_AMOUNT, field='pub_date'):
+    paginator = CursorPaginator(posts, paginator_number, field)
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+    if page_number is not None:
+        # Старые ссылки вида ?page=N продолжают работать через OFFSET.
+        return Paginator(
+            paginator.object_list, paginator_number
+        ).get_page(page_number)
+    return paginator.page(request.GET.get('cursor'))
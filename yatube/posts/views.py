@@ -1,72 +1,126 @@
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
 
-from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post, User
-from .utils import paginate_page
-from yatube.settings import LATEST_POSTS_COUNT
-
+from core.db_router import pin_to_primary
 
+from . import group_windows
+from .caching import feed_cache
+from .forms import CommentForm, PostForm
+from .models import Follow, Group, Post, User
+from .page_cache import cache_anonymous_page, surrogate_keys
+from .recommendations import suggestions_for
+from .search import search_post_ids
+from .stats import get_stats
+from .thumbnails import enqueue_thumbnails
+from .timelines import timeline_posts
+from .utils import CursorPaginator, paginate_page
+from yatube.settings import COMMENTS_PER_PAGE, PAGINATOR_AMOUNT
+
+
+@cache_anonymous_page
 def index(request):
-    posts = Post.objects.all()
+    surrogate_keys(request, 'index')
+    posts = Post.objects.for_feed()
     template = 'posts/index.html'
-    paginator_number = LATEST_POSTS_COUNT
+    paginator_number = PAGINATOR_AMOUNT
     context = {
-        'page_obj': paginate_page(posts, request, paginator_number)
+        'page_obj': paginate_page(posts, request, paginator_number),
+        **feed_cache(request, 'index')
     }
     return render(request, template, context)
 
 
+@cache_anonymous_page
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
+    surrogate_keys(request, f'group:{group.pk}')
     template = 'posts/group_list.html'
-    posts = group.posts.select_related('author', 'group')
-    paginator_number = LATEST_POSTS_COUNT
+    paginator_number = PAGINATOR_AMOUNT
+    if 'cursor' in request.GET or 'page' in request.GET:
+        page_obj = paginate_page(
+            group.posts.for_feed(), request, paginator_number
+        )
+    else:
+        page_obj = group_windows.first_page(group, paginator_number)
     context = {
         'group': group,
-        'page_obj': paginate_page(posts, request, paginator_number)
+        'page_obj': page_obj,
+        **feed_cache(request, f'group:{group.pk}')
     }
     return render(request, template, context)
 
 
+@cache_anonymous_page
 def profile(request, username):
     author = get_object_or_404(User, username=username)
+    surrogate_keys(request, f'profile:{author.pk}', f'author:{author.pk}')
     template = 'posts/profile.html'
-    posts = author.posts.prefetch_related('group')
+    posts = author.posts.for_feed()
     following = (
         request.user.is_authenticated
         and Follow.objects.filter(
             user=request.user, author=author
         ).exists()
     )
-    posts_count = author.posts.count()
-    paginator_number = LATEST_POSTS_COUNT
+    paginator_number = PAGINATOR_AMOUNT
     context = {
         'author': author,
         'page_obj': paginate_page(posts, request, paginator_number),
         'following': following,
-        'posts_count': posts_count
+        'stats': get_stats(author),
+        'suggestions': (
+            suggestions_for(request.user, exclude=[author.pk])
+            if request.user.is_authenticated else []
+        ),
+        **feed_cache(request, f'profile:{author.pk}')
+    }
+    return render(request, template, context)
+
+
+def search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    page_obj = Paginator(
+        search_post_ids(query), PAGINATOR_AMOUNT
+    ).get_page(request.GET.get('page'))
+    posts = Post.objects.for_feed().in_bulk(page_obj.object_list)
+    page_obj.object_list = [
+        posts[post_id] for post_id in page_obj.object_list
+        if post_id in posts
+    ]
+    context = {
+        'query': query,
+        'page_obj': page_obj,
     }
     return render(request, template, context)
 
 
+@cache_anonymous_page
 def post_detail(request, post_id):
     post = get_object_or_404(
         Post.objects.select_related('group', 'author'),
         pk=post_id
     )
+    surrogate_keys(request, f'post:{post.pk}', f'author:{post.author_id}')
     template = 'posts/post_detail.html'
-    comments = Comment.objects.filter(post_id=post_id)
+    comments = CursorPaginator(
+        post.comments.select_related('author'),
+        COMMENTS_PER_PAGE,
+        field='created'
+    ).page(request.GET.get('comments'))
     form = CommentForm(request.POST or None)
     context = {
         'post': post,
         'form': form,
-        'comments': comments
+        'comments': comments,
+        'author_stats': get_stats(post.author)
     }
     return render(request, template, context)
 
 
 @login_required
+@pin_to_primary
 def post_create(request):
     template = 'posts/create_post.html'
     form = PostForm(
@@ -83,10 +137,12 @@ def post_create(request):
     post = form.save(commit=False)
     post.author = request.user
     post.save()
+    enqueue_thumbnails(post)
     return redirect('posts:profile', post.author.username)
 
 
 @login_required
+@pin_to_primary
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if post.author != request.user:
@@ -98,7 +154,9 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            enqueue_thumbnails(post)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
@@ -109,6 +167,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@pin_to_primary
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -123,18 +182,18 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     template = 'posts/follow.html'
-    posts = Post.objects.select_related(
-        'author',
-        'group'
-    ).filter(author__following__user=request.user)
-    paginator_number = LATEST_POSTS_COUNT
+    posts = timeline_posts(request.user).for_feed()
+    paginator_number = PAGINATOR_AMOUNT
     context = {
-        'page_obj': paginate_page(posts, request, paginator_number),
+        'page_obj': paginate_page(posts, request, paginator_number,
+                                  field='timeline_date'),
+        **feed_cache(request, f'follow:{request.user.pk}', 'index')
     }
     return render(request, template, context)
 
 
 @login_required
+@pin_to_primary
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     user = request.user
@@ -144,6 +203,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@pin_to_primary
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     user = request.user